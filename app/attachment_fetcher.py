@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from manifest import Manifest
+
+
+class AttachmentFetcher:
+    """
+    Downloads the presentations and other files attached to Sched sessions. Files are fetched
+    concurrently over a pooled session and revalidated with conditional requests using the
+    URL, size and ETag/Last-Modified recorded in a manifest, so unchanged attachments are not
+    downloaded again. The manifest also remembers which files still need uploading.
+    """
+
+    def __init__(self, presentation_directory, other_files_directory, manifest_path, max_workers=8, timeout=60):
+        self.presentation_directory = presentation_directory
+        self.other_files_directory = other_files_directory
+        self.max_workers = max_workers
+        self.timeout = timeout
+        for directory in [presentation_directory, other_files_directory]:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+        self.manifest = Manifest(manifest_path)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.stats = {"downloaded": 0, "not_modified": 0, "failed": 0}
+
+    @staticmethod
+    def get_safe_file_name(file_name):
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", file_name).strip("_")
+
+    def get_attachments(self, sessions):
+        """
+        Returns a list of (url, local path) for the files attached to the sessions. The first PDF
+        of a session is its presentation, <session id>.pdf, and any other files are saved as
+        <session id>-<file name> in the other files directory. Sched lists a session's files as
+        {"name": ..., "path": ...}; entries without a URL are reported and skipped.
+        """
+        attachments = []
+        sessions_with_files = 0
+        skipped_files = 0
+        for session in sessions.values():
+            files = session.get("files") or []
+            if not isinstance(files, list):
+                print("WARNING: Unexpected files for {}: {!r}".format(session["session_id"], files))
+                continue
+            if files:
+                sessions_with_files += 1
+            has_presentation = False
+            for attachment in files:
+                if not isinstance(attachment, dict):
+                    attachment = {"path": attachment} if isinstance(attachment, str) else {}
+                url = attachment.get("path") or attachment.get("url")
+                file_name = self.get_safe_file_name(attachment.get("name") or os.path.basename(url or ""))
+                if not url or not file_name:
+                    skipped_files += 1
+                    print("WARNING: Skipping an attachment of {} without a URL or name: {!r}".format(
+                        session["session_id"], attachment))
+                    continue
+                if url.startswith("//"):
+                    url = "https:" + url
+                if not has_presentation and file_name.lower().endswith(".pdf"):
+                    has_presentation = True
+                    local_path = os.path.join(self.presentation_directory, "{}.pdf".format(session["session_id"]))
+                else:
+                    local_path = os.path.join(self.other_files_directory, "{}-{}".format(session["session_id"], file_name))
+                attachments.append((url, local_path))
+        print("{} of {} sessions have attached files ({} attachments, {} skipped).".format(
+            sessions_with_files, len(sessions), len(attachments), skipped_files))
+        if sessions and not sessions_with_files:
+            print("WARNING: None of the sessions have attached files, check that the Sched export includes them.")
+        return attachments
+
+    def fetch(self, url, local_path):
+        """Downloads an attachment unless it is unchanged, returning True if the file was written"""
+        with self.lock:
+            cached = self.manifest.get(local_path)
+        headers = {}
+        if cached and cached["url"] == url and os.path.isfile(local_path) and os.path.getsize(local_path) == cached["size"]:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and headers:
+                with self.lock:
+                    self.stats["not_modified"] += 1
+                return False
+            if response.status_code != 200:
+                response.raise_for_status()
+                raise requests.exceptions.HTTPError("Unexpected status {} for {}".format(response.status_code, url))
+            temp_path = "{}.{}.tmp".format(local_path, threading.get_ident())
+            with open(temp_path, "wb") as attachment_file:
+                for block in response.iter_content(1024 * 1024):
+                    attachment_file.write(block)
+            os.replace(temp_path, local_path)
+            with self.lock:
+                self.stats["downloaded"] += 1
+                self.manifest.set(local_path, {
+                    "url": url,
+                    "size": os.path.getsize(local_path),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "uploaded": False
+                })
+        return True
+
+    def download(self, sessions):
+        """
+        Fetches the attachments of the sessions concurrently, returning the list of files that
+        were written and a dict of URL -> error for the ones that failed.
+        """
+        attachments = self.get_attachments(sessions)
+        changed_files = []
+        failures = {}
+
+        def fetch_attachment(attachment):
+            try:
+                return attachment, self.fetch(*attachment), None
+            except Exception as e:
+                return attachment, False, e
+
+        if attachments:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(attachments))) as executor:
+                for (url, local_path), changed, error in executor.map(fetch_attachment, attachments):
+                    if error is not None:
+                        failures[url] = error
+                        self.stats["failed"] += 1
+                    elif changed:
+                        changed_files.append(local_path)
+        self.manifest.save()
+        print("Attachments: {downloaded} downloaded, {not_modified} not modified, {failed} failed".format(**self.stats))
+        return changed_files, failures
+
+    def get_pending_uploads(self):
+        """Returns the downloaded files which haven't been uploaded yet"""
+        return sorted(path for path in self.manifest.keys()
+                      if not self.manifest.get(path).get("uploaded", True) and os.path.isfile(path))
+
+    def mark_uploaded(self, paths):
+        for path in paths:
+            entry = self.manifest.get(path)
+            if entry:
+                self.manifest.set(path, dict(entry, uploaded=True))
+        self.manifest.save()
+
+    def close(self):
+        self.session.close()
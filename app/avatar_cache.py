@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from manifest import Manifest
+
+
+class AvatarCache:
+    """
+    A persistent cache of speaker avatars. Avatars are revalidated with conditional requests
+    using the stored ETag/Last-Modified headers and concurrent requests for the same URL are
+    merged into a single fetch.
+    """
+
+    def __init__(self, cache_directory, image_directory, max_workers=8, timeout=30):
+        self.cache_directory = cache_directory
+        # The directory the SocialImageGenerator loads speaker images from
+        self.image_directory = image_directory
+        self.timeout = timeout
+        if not os.path.exists(self.cache_directory):
+            os.makedirs(self.cache_directory)
+        self.manifest = Manifest(os.path.join(self.cache_directory, "manifest.json"))
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {"downloaded": 0, "not_modified": 0, "failed": 0}
+
+    @staticmethod
+    def normalize_url(url):
+        """Normalizes an avatar URL so the same image is only cached once"""
+        url = url.strip()
+        if url.startswith("//"):
+            url = "https:" + url
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+    def get_file_name(self, normalized_url):
+        """Returns the cached file name for an avatar URL"""
+        extension = os.path.splitext(urlsplit(normalized_url).path)[1].lower()
+        if extension not in [".jpg", ".jpeg", ".png", ".gif"]:
+            extension = ".jpg"
+        return "avatar-{}{}".format(hashlib.sha1(normalized_url.encode("utf-8")).hexdigest()[:16], extension)
+
+    def fetch(self, url):
+        """
+        Returns a Future resolving to the file name of the avatar in the image directory.
+        Requests for a URL which is already being fetched share the same Future.
+        """
+        normalized_url = self.normalize_url(url)
+        with self.lock:
+            future = self.in_flight.get(normalized_url)
+            if future is None:
+                future = self.executor.submit(self.download, normalized_url)
+                self.in_flight[normalized_url] = future
+        return future
+
+    def prefetch(self, urls):
+        """Starts fetching all of the given avatar URLs concurrently"""
+        for url in set(urls):
+            self.fetch(url)
+
+    def download(self, normalized_url):
+        """Downloads an avatar if it has changed since it was cached"""
+        file_name = self.get_file_name(normalized_url)
+        cache_path = os.path.join(self.cache_directory, file_name)
+        with self.lock:
+            cached = self.manifest.get(normalized_url)
+        headers = {}
+        if cached and os.path.isfile(cache_path):
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = self.session.get(normalized_url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                with self.lock:
+                    self.stats["not_modified"] += 1
+            elif response.status_code == 200:
+                temp_path = "{}.{}.tmp".format(cache_path, threading.get_ident())
+                with open(temp_path, "wb") as avatar_file:
+                    avatar_file.write(response.content)
+                os.replace(temp_path, cache_path)
+                with self.lock:
+                    self.stats["downloaded"] += 1
+                    self.manifest.set(normalized_url, {
+                        "file_name": file_name,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified")
+                    })
+            else:
+                response.raise_for_status()
+                raise requests.exceptions.HTTPError(
+                    "Unexpected status {} for {}".format(response.status_code, normalized_url))
+        except Exception:
+            with self.lock:
+                self.stats["failed"] += 1
+            raise
+        self.install(cache_path, file_name)
+        return file_name
+
+    def install(self, cache_path, file_name):
+        """Copies a cached avatar into the image directory if it is missing or out of date"""
+        image_path = os.path.join(self.image_directory, file_name)
+        cache_stat = os.stat(cache_path)
+        try:
+            image_stat = os.stat(image_path)
+            if image_stat.st_size == cache_stat.st_size and image_stat.st_mtime >= cache_stat.st_mtime:
+                return
+        except OSError:
+            pass
+        temp_path = "{}.{}.tmp".format(image_path, threading.get_ident())
+        shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, image_path)
+
+    def close(self):
+        """Waits for outstanding fetches and saves the cache manifest"""
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        self.manifest.save()
+        print("Avatars: {downloaded} downloaded, {not_modified} not modified, {failed} failed".format(**self.stats))
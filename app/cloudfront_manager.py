@@ -0,0 +1,73 @@
+import time
+from urllib.parse import quote
+
+# CloudFront allows up to 3,000 individual paths in progress per distribution
+MAX_INVALIDATION_PATHS = 3000
+# One batch, so a run leaves most of the in-progress quota to invalidations from other jobs
+DEFAULT_INVALIDATION_THRESHOLD = 1000
+
+
+class CloudFrontManager:
+    """Creates CloudFront invalidations for the exact S3 keys that have changed"""
+
+    def __init__(self, distribution_id, client=None, batch_size=1000, wildcard_threshold=DEFAULT_INVALIDATION_THRESHOLD,
+                 session=None):
+        self.distribution_id = distribution_id
+        if client is None:
+            import boto3
+            client = (session or boto3).client("cloudfront")
+        self.client = client
+        self.batch_size = min(batch_size, MAX_INVALIDATION_PATHS)
+        self.wildcard_threshold = wildcard_threshold
+
+    @staticmethod
+    def key_to_path(key):
+        """Converts an S3 key into an URL encoded CloudFront path"""
+        return "/" + quote(key.lstrip("/"), safe="/-_.~")
+
+    def create_invalidation(self, paths):
+        response = self.client.create_invalidation(
+            DistributionId=self.distribution_id,
+            InvalidationBatch={
+                "Paths": {
+                    "Quantity": len(paths),
+                    "Items": paths
+                },
+                "CallerReference": "connect-automation-{}-{}".format(time.time(), len(paths))
+            })
+        invalidation_id = response["Invalidation"]["Id"]
+        print("Created invalidation {} for {} paths".format(invalidation_id, len(paths)))
+        return invalidation_id
+
+    @staticmethod
+    def is_quota_error(error):
+        """Whether an error is CloudFront refusing the invalidation as too many paths are in progress"""
+        error_code = (getattr(error, "response", None) or {}).get("Error", {}).get("Code")
+        return error_code == "TooManyInvalidationsInProgress" or type(error).__name__ == "TooManyInvalidationsInProgress"
+
+    def invalidate_keys(self, keys, wildcard_path):
+        """
+        Invalidates the paths of the given S3 keys in batches. If there are more keys than the
+        wildcard threshold, or CloudFront has too many invalidations in progress to take them,
+        the wildcard_path is invalidated instead. Returns the list of invalidation ids created.
+        """
+        paths = sorted(set(self.key_to_path(key) for key in keys))
+        if not paths:
+            print("No changed paths to invalidate.")
+            return []
+        if len(paths) > self.wildcard_threshold:
+            print("{} changed paths is over the threshold of {}, invalidating {}".format(
+                len(paths), self.wildcard_threshold, wildcard_path))
+            return [self.create_invalidation([wildcard_path])]
+        invalidation_ids = []
+        for index in range(0, len(paths), self.batch_size):
+            try:
+                invalidation_ids.append(self.create_invalidation(paths[index:index + self.batch_size]))
+            except Exception as e:
+                if not self.is_quota_error(e):
+                    raise
+                print("Too many invalidations in progress for {} paths, invalidating {}".format(
+                    len(paths) - index, wildcard_path))
+                invalidation_ids.append(self.create_invalidation([wildcard_path]))
+                break
+        return invalidation_ids
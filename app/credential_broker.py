@@ -0,0 +1,170 @@
+import base64
+import datetime
+import json
+import os
+import threading
+import time
+
+STS_REQUEST_URL = "https://sts.amazonaws.com/"
+STS_REQUEST_BODY = "Action=GetCallerIdentity&Version=2011-06-15"
+
+
+class CredentialBroker:
+    """
+    Authenticates to Vault once per process and caches secrets and STS credentials in memory
+    until their lease or expiry time. Anything within refresh_margin seconds of expiring is
+    fetched again on its next use, so long batch runs don't end up with stale credentials.
+    boto3 clients created from get_boto3_session refresh their credentials through the broker.
+    The Vault URL, HTTP session and STS client can be swapped for local stubs.
+    """
+
+    def __init__(self, vault_url, vault_role, role_arn=None, role_session_name=None, refresh_margin=300,
+                 http_session=None, sts_client=None):
+        self.vault_url = vault_url.rstrip("/")
+        self.vault_role = vault_role
+        self.role_arn = role_arn
+        self.role_session_name = role_session_name
+        self.refresh_margin = refresh_margin
+        self.http_session = http_session
+        self.sts_client = sts_client
+        self.lock = threading.RLock()
+        self.vault_token = None
+        self.vault_token_expiry = 0
+        self.aws_credentials = None
+        self.aws_credentials_expiry = 0
+        self.boto3_session = None
+        # Secret path -> (secret, expiry time)
+        self.secrets = {}
+
+    def needs_refresh(self, expiry):
+        return time.time() >= expiry - self.refresh_margin
+
+    def get_http_session(self):
+        if self.http_session is None:
+            import requests
+            self.http_session = requests.Session()
+        return self.http_session
+
+    def get_aws_credentials(self, force_refresh=False):
+        """
+        Returns the credentials of the assumed role, or of the default credential chain if no
+        role is set, as a dict of AccessKeyId, SecretAccessKey and SessionToken.
+        """
+        with self.lock:
+            if force_refresh or self.aws_credentials is None or self.needs_refresh(self.aws_credentials_expiry):
+                if self.role_arn:
+                    if self.sts_client is None:
+                        import boto3
+                        self.sts_client = boto3.client("sts")
+                    credentials = self.sts_client.assume_role(
+                        RoleArn=self.role_arn, RoleSessionName=self.role_session_name)["Credentials"]
+                    expiration = credentials["Expiration"]
+                    if isinstance(expiration, datetime.datetime):
+                        expiration = expiration.timestamp()
+                    self.aws_credentials_expiry = float(expiration)
+                else:
+                    import botocore.session
+                    frozen = botocore.session.Session().get_credentials().get_frozen_credentials()
+                    credentials = {
+                        "AccessKeyId": frozen.access_key,
+                        "SecretAccessKey": frozen.secret_key,
+                        "SessionToken": frozen.token
+                    }
+                    self.aws_credentials_expiry = float("inf")
+                self.aws_credentials = credentials
+            return self.aws_credentials
+
+    def get_credential_metadata(self, force_refresh=False):
+        """Returns the assumed role's credentials in the form botocore's RefreshableCredentials expects"""
+        credentials = self.get_aws_credentials(force_refresh)
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials.get("SessionToken"),
+            "expiry_time": datetime.datetime.fromtimestamp(
+                self.aws_credentials_expiry, datetime.timezone.utc).isoformat()
+        }
+
+    def get_boto3_session(self):
+        """
+        Returns a boto3 Session whose clients use the assumed role's credentials and assume the
+        role again through the broker when they are about to expire, so long lived clients (e.g in
+        the resident worker) keep working. Without a role the default credential chain is used.
+        """
+        with self.lock:
+            if self.boto3_session is None:
+                import boto3
+                import botocore.session
+                from botocore.credentials import CredentialProvider, RefreshableCredentials
+                botocore_session = botocore.session.get_session()
+                if self.role_arn:
+                    broker = self
+
+                    class BrokerCredentialProvider(CredentialProvider):
+                        METHOD = "connect-credential-broker"
+                        CANONICAL_NAME = "ConnectCredentialBroker"
+
+                        def load(self):
+                            return RefreshableCredentials.create_from_metadata(
+                                metadata=broker.get_credential_metadata(),
+                                # botocore refreshes earlier than the broker's margin so always assume the role again
+                                refresh_using=lambda: broker.get_credential_metadata(force_refresh=True),
+                                method=self.METHOD)
+
+                    botocore_session.get_component("credential_provider").insert_before(
+                        "env", BrokerCredentialProvider())
+                self.boto3_session = boto3.session.Session(botocore_session=botocore_session)
+            return self.boto3_session
+
+    def get_login_payload(self):
+        """Builds the Vault AWS IAM login payload from a SigV4 signed sts:GetCallerIdentity request"""
+        from botocore.auth import SigV4Auth
+        from botocore.awsrequest import AWSRequest
+        from botocore.credentials import Credentials
+        aws_credentials = self.get_aws_credentials()
+        request = AWSRequest(method="POST", url=STS_REQUEST_URL, data=STS_REQUEST_BODY, headers={
+            "Content-Type": "application/x-www-form-urlencoded; charset=utf-8"})
+        SigV4Auth(Credentials(
+            aws_credentials["AccessKeyId"], aws_credentials["SecretAccessKey"], aws_credentials.get("SessionToken")),
+            "sts", "us-east-1").add_auth(request)
+        headers = dict((name, [value]) for name, value in request.headers.items())
+        return {
+            "role": self.vault_role,
+            "iam_http_request_method": "POST",
+            "iam_request_url": base64.b64encode(STS_REQUEST_URL.encode("utf-8")).decode("utf-8"),
+            "iam_request_body": base64.b64encode(STS_REQUEST_BODY.encode("utf-8")).decode("utf-8"),
+            "iam_request_headers": base64.b64encode(json.dumps(headers).encode("utf-8")).decode("utf-8")
+        }
+
+    def get_vault_token(self):
+        """Logs in to Vault with the AWS IAM auth method, reusing the token until its lease is nearly up"""
+        with self.lock:
+            if self.vault_token is None or self.needs_refresh(self.vault_token_expiry):
+                response = self.get_http_session().post(
+                    "{}/v1/auth/aws/login".format(self.vault_url), json=self.get_login_payload())
+                if response.status_code != 200:
+                    raise Exception("Vault login failed ({}): {}".format(response.status_code, response.text))
+                auth = response.json()["auth"]
+                self.vault_token = auth["client_token"]
+                # A lease duration of 0 means the token doesn't expire
+                lease_duration = auth.get("lease_duration") or 0
+                self.vault_token_expiry = time.time() + lease_duration if lease_duration else float("inf")
+            return self.vault_token
+
+    def get_secret(self, secret_path):
+        """Returns the Vault response for the secret, cached for its lease duration"""
+        with self.lock:
+            cached = self.secrets.get(secret_path)
+            if cached and not self.needs_refresh(cached[1]):
+                return cached[0]
+            response = self.get_http_session().get(
+                "{}/v1/{}".format(self.vault_url, secret_path), headers={"X-Vault-Token": self.get_vault_token()})
+            if response.status_code != 200:
+                raise Exception("Failed to read {} from Vault ({}): {}".format(
+                    secret_path, response.status_code, response.text))
+            secret = response.json()
+            # Secrets without a lease are kept for as long as the Vault token
+            lease_duration = secret.get("lease_duration") or 0
+            expiry = time.time() + lease_duration if lease_duration else self.vault_token_expiry
+            self.secrets[secret_path] = (secret, expiry)
+            return secret
@@ -1,13 +1,107 @@
 import sys
 from git import Repo
-import vault_auth
 import os
+import atexit
+import shlex
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
 from datetime import datetime, timezone
 import requests
+from manifest import Manifest
+
+
+class GitHubAPIClient:
+    """
+    A small GitHub REST API client using one pooled HTTP session. GET requests are made
+    conditional with cached ETags so unchanged responses come back as 304s, which don't
+    count against the rate limit, and rate limited requests are retried after backing off.
+    """
+
+    def __init__(self, auth_token, base_url="https://api.github.com", etag_cache_path=None, max_retries=3,
+                 max_wait=300, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            "Authorization": "token {}".format(auth_token),
+            "Accept": "application/vnd.github.v3+json"
+        })
+        self.etag_cache = Manifest(etag_cache_path) if etag_cache_path else None
+        self.etag_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+
+    def get_retry_delay(self, response, attempt):
+        """Returns how long to wait before retrying the response or None if it shouldn't be retried"""
+        if response.status_code in [403, 429]:
+            if "Retry-After" in response.headers:
+                return min(float(response.headers["Retry-After"]), self.max_wait)
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                reset_time = float(response.headers.get("X-RateLimit-Reset", time.time()))
+                return min(max(reset_time - time.time(), 1), self.max_wait)
+            return None
+        if response.status_code >= 500:
+            return 2 ** attempt
+        return None
+
+    def send(self, method, path, **kwargs):
+        """Sends a request, retrying when rate limited or on server errors"""
+        url = "{}/{}".format(self.base_url, path.lstrip("/"))
+        attempt = 0
+        while True:
+            response = self.session.request(method, url, **kwargs)
+            delay = self.get_retry_delay(response, attempt)
+            if delay is None or attempt >= self.max_retries:
+                return response
+            print("GitHub API returned {} for {}, retrying in {:.0f}s".format(response.status_code, path, delay))
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, path, params=None):
+        """
+        Sends a conditional GET request, returning (status_code, data). A 304 is
+        returned as a 200 with the cached data.
+        """
+        cache_key = "{}?{}".format(path, "&".join("{}={}".format(key, value) for key, value in sorted((params or {}).items())))
+        cached = self.etag_cache.get(cache_key) if self.etag_cache else None
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = self.send("GET", path, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return 200, cached["data"]
+        if response.status_code != 200:
+            return response.status_code, response.text
+        data = response.json()
+        if self.etag_cache is not None and response.headers.get("ETag"):
+            with self.etag_lock:
+                self.etag_cache.set(cache_key, {"etag": response.headers["ETag"], "data": data})
+                self.etag_cache.save()
+        return 200, data
+
+    def post_json(self, path, data):
+        """Sends a POST request, returning (status_code, data)"""
+        response = self.send("POST", path, json=data)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, response.text
+
+    def find_open_pull_request(self, repo_key, head_branch):
+        """Returns the open pull request for head_branch or None, filtering on the server"""
+        status_code, pulls = self.get_json("repos/{}/pulls".format(repo_key), {
+            "head": "{}:{}".format(repo_key.split("/")[0], head_branch),
+            "state": "open"
+        })
+        if status_code != 200:
+            raise Exception("Failed to get list of current pull requests ({}): {}".format(status_code, pulls))
+        return pulls[0] if pulls else None
+
+
 class GitHubManager:
 
-    def __init__(self, repo_url, working_directory, path_to_ssh_key, auth_token, reviewers, changes_branch_name):
+    def __init__(self, repo_url, working_directory, path_to_ssh_key, auth_token, reviewers, changes_branch_name, sparse_paths=None,
+                 api_base_url="https://api.github.com"):
 
         self.github_repo = repo_url
         self.change_branch = changes_branch_name
@@ -20,38 +114,101 @@ class GitHubManager:
         self.reviewers = reviewers
         self.repo_output_name = "website"
         self.repo_dir = "{}{}".format(self.working_dir, self.repo_output_name)
+        # If set, only these paths are checked out from a shallow, partial clone
+        self.sparse_paths = sparse_paths
+        self.base_branch = "master"
+        # A single ssh-agent and multiplexed SSH connection is shared by every git command
+        self.git_env = None
+        self.ssh_control_directory = None
+        self.ssh_lock = threading.Lock()
+        self.api = GitHubAPIClient(auth_token, api_base_url, "{}manifests/github-etags.json".format(self.working_dir))
         self.repo = self.setup_repo()
 
-    def run_command(self, command):
+    def run_command(self, command, cwd=None, env=None):
         result = subprocess.run(
-            command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, env=env)
         if result.returncode != 0:
             self.error = True
             print("ERROR: '%s'" % command)
             print(result.stdout.decode("utf-8"))
             print(result.stderr.decode("utf-8"))
             sys.exit(result.returncode)
+        return result.stdout.decode("utf-8")
+
+    def start_ssh_session(self):
+        """
+        Starts one ssh-agent holding the deploy key and sets up the environment so git
+        reuses a single persistent (ControlMaster) SSH connection to GitHub.
+        """
+        with self.ssh_lock:
+            if self.git_env is not None:
+                return self.git_env
+            env = os.environ.copy()
+            agent_output = self.run_command("ssh-agent -s")
+            for line in agent_output.splitlines():
+                for variable in ["SSH_AUTH_SOCK", "SSH_AGENT_PID"]:
+                    if line.startswith("{}=".format(variable)):
+                        env[variable] = line.split("=", 1)[1].split(";", 1)[0]
+            self.run_command('ssh-add "{}"'.format(self.ssh_key_path), env=env)
+            # Unix socket paths are limited in length so keep the control socket in a short temp dir
+            self.ssh_control_directory = tempfile.mkdtemp(prefix="ssh-")
+            env["GIT_SSH_COMMAND"] = "ssh -o ControlMaster=auto -o ControlPath={}/%C -o ControlPersist=600".format(
+                self.ssh_control_directory)
+            self.git_env = env
+            atexit.register(self.close)
+            return self.git_env
+
+    def close(self):
+        """Closes the persistent SSH connection and stops the ssh-agent"""
+        with self.ssh_lock:
+            if self.git_env is None:
+                return
+            env = self.git_env
+            self.git_env = None
+            subprocess.run("{} -O exit git@github.com".format(env["GIT_SSH_COMMAND"]), shell=True, env=env,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            subprocess.run("ssh-agent -k", shell=True, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            shutil.rmtree(self.ssh_control_directory, ignore_errors=True)
 
     def run_repo_command(self, command):
         """Runs a command inside the repo directory"""
-        os.chdir(self.repo_dir)
-        self.run_command(command)
-        os.chdir(self.working_dir)
+        return self.run_command(command, cwd=self.repo_dir)
 
     def run_git_command(self, command, repo_dir=False):
-        """ Run a git command on the repo """
-        # Make sure we are in the repo directory.
-        if not repo_dir:
-            os.chdir(self.repo_dir)
+        """ Run a git command on the repo using the shared SSH session """
+        # repo_dir=True runs the command from the working directory e.g for cloning
+        cwd = self.working_dir if repo_dir else self.repo_dir
+        env = self.start_ssh_session()
+        print("running {}".format(command))
+        return self.run_command(command, cwd=cwd, env=env)
+
+    def setup_sparse_repo(self):
+        """
+        Sets up a shallow, partial clone of the base branch with only the sparse paths checked out,
+        then checks out the change branch. Updates fetch just the base and change branches.
+        """
+        if not os.path.isdir(self.repo_dir):
+            os.mkdir(self.repo_dir)
+            print("Cloning {} sparsely...".format(", ".join(self.sparse_paths)))
+            self.run_git_command(
+                "git clone --depth 1 --filter=blob:none --sparse --single-branch --branch {0} git@github.com:{1}.git {2}".format(
+                    self.base_branch, self.github_repo_key, self.repo_output_name), True)
+        else:
+            print("Fetch latest changes...")
+            self.run_git_command("git fetch --depth 1 origin {0}:refs/remotes/origin/{0}".format(self.base_branch))
+            self.run_repo_command("git checkout -B {0} origin/{0}".format(self.base_branch))
+        self.run_repo_command("git sparse-checkout init --cone")
+        self.run_repo_command("git sparse-checkout set {}".format(" ".join(self.sparse_paths)))
+        print("Verifying branch exists...")
+        remote_branch = self.run_git_command("git ls-remote --heads origin {}".format(self.change_branch))
+        if remote_branch.strip():
+            print("{} has been found.".format(self.change_branch))
+            self.run_git_command("git fetch --depth 1 origin {0}:refs/remotes/origin/{0}".format(self.change_branch))
+            self.run_repo_command("git checkout -B {0} origin/{0}".format(self.change_branch))
         else:
-            os.chdir(self.working_dir)
-        git_cmd = 'ssh-add "{}"; {}'.format(self.ssh_key_path, command)
-        full_cmd = "ssh-agent bash -c '{}'".format(git_cmd)
-        print("running {}".format(full_cmd))
-        self.run_command(full_cmd)
-        # Change back into the working directory
-        # os.chdir(self.working_dir)
-        os.chdir(self.working_dir)
+            print("Creating branch...")
+            self.run_repo_command("git checkout -B {} {}".format(self.change_branch, self.base_branch))
+        return Repo(self.repo_dir)
 
     def setup_repo(self):
         """
@@ -62,9 +219,11 @@ class GitHubManager:
             - Make sure the local change branch is up to date with the remote version if it exists
             - If not then checkout a new clean branch off of master
         """
+        if self.sparse_paths:
+            return self.setup_sparse_repo()
         # Check to see if the repo directory exists.
         if not os.path.isdir(self.repo_dir):
-            os.mkdir("website")
+            os.mkdir(self.repo_dir)
             # Make sure we are in the working directory.
             # os.chdir(self.working_dir)
             print("Cloning repo...")
@@ -100,14 +259,48 @@ class GitHubManager:
         
         return repo
 
-    def commit_and_push_changes(self, commit_message):
+    def get_pathspec(self, paths):
+        """Returns the quoted pathspec arguments for paths, or the whole tree if paths is None"""
+        if paths is None:
+            return ""
+        return "-- {}".format(" ".join(shlex.quote(os.path.relpath(path, self.repo_dir)) for path in sorted(paths)))
+
+    def get_changed_files(self, paths=None):
+        """
+        Returns the modified, deleted or untracked files, only looking at paths if given
+        rather than walking the whole working tree.
+        """
+        if paths is not None and len(paths) == 0:
+            return []
+        output = self.run_repo_command("git status --porcelain -z {}".format(self.get_pathspec(paths)))
+        changed_files = []
+        entries = iter(output.split("\0"))
+        for entry in entries:
+            if not entry:
+                continue
+            changed_files.append(entry[3:])
+            # Renames and copies are followed by the original path
+            if entry[0] in "RC":
+                changed_files.append(next(entries))
+        return changed_files
+
+    def has_changes(self, paths=None):
+        return len(self.get_changed_files(paths)) > 0
+
+    def commit_and_push_changes(self, commit_message, paths=None):
         """
-        Commits and pushes any local changes that have been made.
+        Commits and pushes any local changes that have been made, only staging paths if given.
         If changes have been pushed successfully, then reutnr True.
         Else return false
         """
         try:
-            self.run_repo_command("git add --all")
+            changed_files = self.get_changed_files(paths)
+            if not changed_files:
+                print("No changes to push!")
+                return False
+            # Only stage what git reported so paths that were never written don't fail the add
+            changed_files = [os.path.join(self.repo_dir, changed_file) for changed_file in changed_files]
+            self.run_repo_command("git add --all {}".format(self.get_pathspec(changed_files)))
             self.run_repo_command("git commit -m '{}'".format(commit_message))
             print("Pushing local changes to origin/{}".format(self.change_branch))
             self.run_git_command("git push origin {}".format(self.repo.active_branch.name))
@@ -121,62 +314,41 @@ class GitHubManager:
         """
         Creates a new pull request if one doesn't already exist.
         """
-        # Set Authorization header for API call
-        headers = {'Authorization': 'token {}'.format(self.auth_token)}
-        # Pull request API URL
-        url = "https://api.github.com/repos/{}/pulls".format(self.github_repo_key)
-        # Get the current pull requests to check a PR is not already open
-        current_pull_requests = requests.get(url, headers=headers)
-        # Check that the status code returned is not erroneous
-        if current_pull_requests.status_code != 200:
+        head_branch = self.repo.active_branch.name
+        # Check that a PR is not already open for the branch
+        try:
+            open_pull_request = self.api.find_open_pull_request(self.github_repo_key, head_branch)
+        except Exception as e:
             print("ERROR: Failed to get list of current pull requests")
-            print(current_pull_requests.text)
+            print(e)
             self.error = True
             return False
-        # Request successfully returned a JSON object
-        else:
-            json = current_pull_requests.json()
-            # Loop over the pull requests checking for self.change_branch
-            pull_open = False
-            for pull in json:
-                if pull["head"]["ref"] == self.repo.active_branch.name:
-                    pull_open = True 
-            # Create a new pull request since one is not currently open
-            if not pull_open:
-                print("Creating pull request...")
-                # Set the data payload
-                data = {
-                    "title": title,
-                    "body": description,
-                    "head": self.repo.active_branch.name,
-                    "base": "master"
-                }
-                # Post the data to the GitHub API
-                result = requests.post(url, json=data, headers=headers)
-                # Check for an erroneous response
-                if result.status_code != 201:
-                    print("ERROR: Failed to create pull request")
-                    print(result.text)
-                    self.error = True
-                    return False
-                # Pull Request has been created successfully.
-                else:
-                    # Get the returned JSON data
-                    json = result.json()
-                    print("Pull request created: {}".format(json["html_url"]))
-                    # Set the reviewers data payload.
-                    data = {
-                        "reviewers": self.reviewers
-                    }
-                    # API URL for adding reviewers.
-                    url = "https://api.github.com/repos/{0}/pulls/{1}/requested_reviewers".format(
-                        self.github_repo_key, json["number"])
-                    # Submit request to add reviewers
-                    result = requests.post(url, json=data, headers=headers)
-                    if result.status_code != 201:
-                        print("ERROR: Failed to add reviewers to the pull request")
-                        print(result.text)
-                        self.error = True
-                        return False
-                    else:
-                        print("Reviewers ({}) have been added succesfully!".format(self.reviewers))
\ No newline at end of file
+        if open_pull_request:
+            print("Pull request already open: {}".format(open_pull_request["html_url"]))
+            return True
+        print("Creating pull request...")
+        # Set the data payload
+        data = {
+            "title": title,
+            "body": description,
+            "head": head_branch,
+            "base": "master"
+        }
+        status_code, result = self.api.post_json("repos/{}/pulls".format(self.github_repo_key), data)
+        # Check for an erroneous response
+        if status_code != 201:
+            print("ERROR: Failed to create pull request")
+            print(result)
+            self.error = True
+            return False
+        print("Pull request created: {}".format(result["html_url"]))
+        # Add the reviewers to the new pull request
+        status_code, result = self.api.post_json("repos/{0}/pulls/{1}/requested_reviewers".format(
+            self.github_repo_key, result["number"]), {"reviewers": self.reviewers})
+        if status_code != 201:
+            print("ERROR: Failed to add reviewers to the pull request")
+            print(result)
+            self.error = True
+            return False
+        print("Reviewers ({}) have been added succesfully!".format(self.reviewers))
+        return True
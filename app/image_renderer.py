@@ -0,0 +1,165 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from render_context import RenderContext
+
+# The SocialImageGenerator used by each worker process of the pool
+_worker_generator = None
+# The RenderContext of this process, kept between runs so the decoded template is reused
+_render_context = None
+
+
+def get_image_options(session_id, session_track, session_title, speaker_image, session_speakers):
+    """Returns the SocialImageGenerator options used to create a session's share image"""
+    return {
+        "file_name": session_id,
+        "elements": {
+            "images": [
+                {
+                    "dimensions": {
+                        "x": 300,
+                        "y": 300
+                    },
+                    "position": {
+                        "x": 820,
+                        "y": 80
+                    },
+                    "image_name": speaker_image,
+                    "circle": "True"
+                }
+            ],
+            "text": [
+                {
+                    "multiline": "True",
+                    "centered": "True",
+                    "wrap_width": 28,
+                    "value": session_speakers,
+                    "position": {
+                        "x": [920, 970],
+                        "y": 400
+                    },
+                    "font": {
+                        "size": 32,
+                        "family": "fonts/Lato-Regular.ttf",
+                        "colour": {
+                            "r": 255,
+                            "g": 255,
+                            "b": 255
+                        }
+                    }
+                },
+                {
+                    "multiline": "False",
+                    "centered": "False",
+                    "wrap_width": 28,
+                    "value": session_id,
+                    "position": {
+                        "x": 80,
+                        "y": 140
+                    },
+                    "font": {
+                        "size": 48,
+                        "family": "fonts/Lato-Bold.ttf",
+                        "colour": {
+                            "r": 255,
+                            "g": 255,
+                            "b": 255
+                        }
+                    }
+                },
+                {
+                    "multiline": "False",
+                    "centered": "False",
+                    "wrap_width": 28,
+                    "value": session_track,
+                    "position": {
+                        "x": 80,
+                        "y": 200
+                    },
+                    "font": {
+                        "size": 28,
+                        "family": "fonts/Lato-Bold.ttf",
+                        "colour": {
+                            "r": 255,
+                            "g": 255,
+                            "b": 255
+                        }
+                    }
+                },
+                {
+                    "multiline": "True",
+                    "centered": "False",
+                    "wrap_width": 28,
+                    "value": session_title,
+                    "position": {
+                        "x": 80,
+                        "y": 240
+                    },
+                    "font": {
+                        "size": 48,
+                        "family": "fonts/Lato-Bold.ttf",
+                        "colour": {
+                            "r": 255,
+                            "g": 255,
+                            "b": 255
+                        }
+                    }
+                }
+            ],
+        }
+    }
+
+
+def get_worker_count(requested_workers):
+    """Returns the number of render workers to use, 0 meaning one per CPU"""
+    if requested_workers and requested_workers > 0:
+        return requested_workers
+    return os.cpu_count() or 1
+
+
+def get_render_context(template_path):
+    """Returns this process's RenderContext for the template, replacing it if the template differs"""
+    global _render_context
+    if _render_context is None or _render_context.template_path != os.path.abspath(template_path):
+        _render_context = RenderContext(template_path)
+    return _render_context
+
+
+def create_generator(generator_options):
+    """Returns a SocialImageGenerator which renders through this process's RenderContext"""
+    from social_image_generator import SocialImageGenerator
+    return get_render_context(generator_options["template"]).create_generator(SocialImageGenerator, generator_options)
+
+
+def _init_worker(generator_options):
+    global _worker_generator
+    _worker_generator = create_generator(generator_options)
+
+
+def _render_image(image_options):
+    """Renders a single image inside a worker process, returning any error rather than raising it"""
+    try:
+        _worker_generator.create_image(image_options)
+        return image_options["file_name"], None
+    except Exception as e:
+        return image_options["file_name"], "{}: {}".format(type(e).__name__, e)
+
+
+def render_images(generator_options, image_options_list, workers):
+    """
+    Renders the share images described by image_options_list across a pool of worker processes.
+    A failed image does not abort the batch. Returns a dict of file name -> error for failed images.
+    """
+    failures = {}
+    if not image_options_list:
+        return failures
+    workers = min(get_worker_count(workers), len(image_options_list))
+    chunk_size = max(1, len(image_options_list) // (workers * 4))
+    # The stage graph runs this from a worker thread, forking the threaded process could copy
+    # locks held by the other stages' threads into the workers, so they start from a fork server
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(generator_options,),
+                             mp_context=multiprocessing.get_context("forkserver")) as executor:
+        for file_name, error in executor.map(_render_image, image_options_list, chunksize=chunk_size):
+            if error:
+                failures[file_name] = error
+    return failures
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+# Matches the default quality ImageMagick used when converting the PNGs to JPEG
+JPEG_QUALITY = 92
+
+
+def get_output_paths(source_path, output_directory, widths):
+    """Returns a dict of width -> derived JPEG path for a source image"""
+    image_name = os.path.splitext(os.path.basename(source_path))[0]
+    return {width: os.path.join(output_directory, str(width), "{}.jpg".format(image_name)) for width in widths}
+
+
+def needs_resizing(source_path, output_paths):
+    """Checks whether any derived JPEG is missing or older than its source image"""
+    source_mtime = os.stat(source_path).st_mtime
+    for output_path in output_paths.values():
+        try:
+            if os.stat(output_path).st_mtime < source_mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def resize_image(source_path, output_paths):
+    """
+    Decodes the source image once and writes a JPEG for every width in output_paths,
+    preserving the aspect ratio. Each JPEG is written to a temporary file and renamed into place.
+    """
+    with Image.open(source_path) as source_image:
+        source_image = source_image.convert("RGB")
+    source_width, source_height = source_image.size
+    for width, output_path in output_paths.items():
+        height = max(1, int(round(source_height * width / float(source_width))))
+        resized_image = source_image.resize((width, height), Image.LANCZOS)
+        temp_path = "{}.tmp".format(output_path)
+        resized_image.save(temp_path, "JPEG", quality=JPEG_QUALITY)
+        os.replace(temp_path, output_path)
+    return source_path
+
+
+def _resize_task(task):
+    source_path, output_paths = task
+    try:
+        resize_image(source_path, output_paths)
+        return source_path, None
+    except Exception as e:
+        return source_path, "{}: {}".format(type(e).__name__, e)
+
+
+def resize_images(source_paths, output_directory, widths, workers=1):
+    """
+    Generates the responsive JPEGs for every source image that is newer than its derived images.
+    Returns a tuple of (resized source paths, dict of source path -> error).
+    """
+    for width in widths:
+        width_directory = os.path.join(output_directory, str(width))
+        if not os.path.exists(width_directory):
+            os.makedirs(width_directory)
+    tasks = []
+    for source_path in source_paths:
+        output_paths = get_output_paths(source_path, output_directory, widths)
+        if needs_resizing(source_path, output_paths):
+            tasks.append((source_path, output_paths))
+    resized = []
+    failures = {}
+    if workers > 1 and len(tasks) > 1:
+        # The stage graph runs this from a worker thread, forking the threaded process could
+        # copy locks held by the other stages' threads into the workers
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("forkserver")) as executor:
+            results = list(executor.map(_resize_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = [_resize_task(task) for task in tasks]
+    for source_path, error in results:
+        if error:
+            failures[source_path] = error
+        else:
+            resized.append(source_path)
+    return resized, failures
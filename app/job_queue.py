@@ -0,0 +1,166 @@
+import copy
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JOB_TYPES = ["daily_tasks", "update_session", "upload_video"]
+
+
+class Job:
+    def __init__(self, job_id, job_type, params):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.params = params
+        self.status = "pending"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.exit_code = None
+        # How many triggers were merged into this job
+        self.triggers = 1
+
+    def to_dict(self):
+        return {
+            "id": self.job_id,
+            "type": self.job_type,
+            "params": copy.deepcopy(self.params),
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "exit_code": self.exit_code,
+            "triggers": self.triggers
+        }
+
+
+class JobQueue:
+    """
+    An in-memory queue of automation jobs which are taken one at a time by the worker.
+    Triggers that arrive while an equivalent job is still pending are merged into it: session
+    updates are combined into one job over all of their event keys, and a pending daily_tasks
+    job absorbs session updates and other daily_tasks triggers since it covers every session.
+    """
+
+    def __init__(self, history_size=50):
+        self.condition = threading.Condition()
+        self.pending = []
+        self.running = None
+        self.history = []
+        self.history_size = history_size
+        self.job_ids = itertools.count(1)
+
+    def find_pending(self, job_type):
+        for job in self.pending:
+            if job.job_type == job_type:
+                return job
+        return None
+
+    def submit(self, job_type, params=None):
+        """Queues a job, returning the new job or the pending job it was merged into"""
+        if job_type not in JOB_TYPES:
+            raise ValueError("Unknown job type {}, expected one of {}".format(job_type, ", ".join(JOB_TYPES)))
+        params = params or {}
+        if not isinstance(params, dict):
+            raise ValueError("params must be a JSON object")
+        for param, param_job_type in [("event_keys", "update_session"), ("session_ids", "upload_video")]:
+            if job_type == param_job_type and not isinstance(params.get(param), list):
+                raise ValueError("{} jobs need a list of {}".format(job_type, param))
+        with self.condition:
+            daily_tasks_job = self.find_pending("daily_tasks")
+            if daily_tasks_job and job_type in ["daily_tasks", "update_session"]:
+                daily_tasks_job.triggers += 1
+                return daily_tasks_job
+            if job_type == "daily_tasks":
+                # Pending session updates are covered by the daily tasks
+                for job in [job for job in self.pending if job.job_type == "update_session"]:
+                    self.pending.remove(job)
+                    job.status = "merged"
+                    self.add_to_history(job)
+            merge_job = self.find_pending(job_type) if job_type in ["update_session", "upload_video"] else None
+            if merge_job:
+                merge_key = "event_keys" if job_type == "update_session" else "session_ids"
+                merged_values = merge_job.params.get(merge_key, []) + [
+                    value for value in params.get(merge_key, []) if value not in merge_job.params.get(merge_key, [])]
+                merge_job.params[merge_key] = merged_values
+                merge_job.triggers += 1
+                return merge_job
+            job = Job(next(self.job_ids), job_type, params)
+            self.pending.append(job)
+            self.condition.notify()
+            return job
+
+    def next_job(self):
+        """Blocks until a job is pending, then marks it as running and returns it"""
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            job = self.pending.pop(0)
+            job.status = "running"
+            job.started = time.time()
+            self.running = job
+            return job
+
+    def complete(self, job, exit_code):
+        with self.condition:
+            job.exit_code = exit_code
+            job.status = "succeeded" if exit_code == 0 else "failed"
+            job.finished = time.time()
+            self.running = None
+            self.add_to_history(job)
+
+    def add_to_history(self, job):
+        self.history.append(job)
+        del self.history[:-self.history_size]
+
+    def get_status(self):
+        with self.condition:
+            return {
+                "running": self.running.to_dict() if self.running else None,
+                "pending": [job.to_dict() for job in self.pending],
+                "history": [job.to_dict() for job in reversed(self.history)]
+            }
+
+
+def create_worker_server(job_queue, host, port):
+    """
+    Creates the worker's HTTP server. POST /jobs with a JSON body of {"type": ..., "params": {...}}
+    queues a job, GET /jobs returns the queue status and GET /health can be used as a liveness check.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status_code, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/jobs":
+                self.send_json(200, job_queue.get_status())
+            elif self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self.send_json(404, {"error": "Not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("Expected a JSON object")
+                job = job_queue.submit(request.get("type"), request.get("params"))
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_json(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            print("worker: {} - {}".format(self.address_string(), format % args))
+
+    return ThreadingHTTPServer((host, port), Handler)
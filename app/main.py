@@ -4,41 +4,75 @@ import argparse
 import datetime
 import json
 import os
-from slugify import slugify
 from jinja2 import utils
 import subprocess
 import frontmatter
+import hashlib
 import time
 import re
 import shlex
 import sys
-from social_image_generator import SocialImageGenerator
-from sched_data_interface import SchedDataInterface
-from connect_json_updater import ConnectJSONUpdater
-from jekyll_post_tool import JekyllPostTool
-from sched_presentation_tool import SchedPresentationTool
-from connect_youtube_uploader import ConnectYoutubeUploader
-import vault_auth
-from github_manager import GitHubManager
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Used to report how long each mode takes to start up
+PROCESS_START_TIME = time.time()
+
+from manifest import Manifest, content_digest
+from image_renderer import create_generator, get_image_options, get_worker_count
+from cloudfront_manager import CloudFrontManager, DEFAULT_INVALIDATION_THRESHOLD
+from s3_sync_manager import S3SyncManager, has_name_prefix
+from sched_snapshot import SchedSnapshot
+from run_report import RunReport, instrumented
+from stage_graph import StageGraph
+
+# Heavy dependencies (boto3, Pillow, the image generator, the Sched, YouTube, GitHub
+# and Vault modules) are imported when the mode that needs them first uses them.
 
 VAULT_URL = "https://login.linaro.org:8200"
 VAULT_ROLE = "vault_connect_automation"
 
-import boto3
-
 class AutomationContainer:
-    def __init__(self, args):
+    def __init__(self, args, work_directory="/app/work_dir/", env=None, dependencies=None, run=True,
+                 assets_directory="/app/assets/"):
+        """
+        Sets up the container and runs the mode selected by args. The work and assets directories,
+        environment and pre-built dependencies (e.g s3_sync or sched_data) can be passed in, and
+        run=False skips running a mode, so that the benchmarks can drive individual stages against
+        local services.
+        """
+        # Lazily constructed dependencies and the time taken to initialise each of them
+        self.dependencies = dict(dependencies or {})
+        self.dependencies_lock = threading.Lock()
+        # One lock per dependency so slow factories don't block unrelated dependencies
+        self.dependency_locks = {}
+        self.startup_times = {}
+        # Args
+        self.args = args
+        self.work_directory = work_directory
+        # The share image templates, fonts and speaker images
+        self.assets_directory = assets_directory
+        # The session ids every stage is restricted to, None for the whole event
+        self.target_session_ids = None
+        # Whether the published resources.json changed and needs invalidating
+        self.resources_json_changed = False
+        self.run_report = RunReport(
+            "{}run_report.json".format(self.work_directory), self.args.profile_stage)
         # Define the CDN URL for Connect static resources
         self.cdn_url = "https://static.linaro.org"
         self.responsive_image_widths = [300, 800, 1200]
         self.role_arn = "arn:aws:iam::691071635361:role/static-linaro-org-connect_Owner"
         self.role_session_name = "ConnectAutomationContainer"
-        self.assume_role(self.role_arn, self.role_session_name)
-        self.work_directory = "/app/work_dir/"
         self.github_reviewers = ["kylekirkby", "pcolmer"]
-        # Args
-        self.args = args
         self.static_bucket = "static-linaro-org"
+        self.cloudfront_distribution_id = "E374OER1SABFCK"
+        self.stage_error_messages = {
+            "social_images": "Error with creating social media images.",
+            "jekyll_posts": "Error with updating posts.",
+            "presentations_download": "Error with updating presentations.",
+            "presentations_upload": "Error with updating presentations.",
+            "resources_json": "Error with updating resources.json."
+        }
         self.accepted_variables = [
             "bamboo_sched_password",
             "bamboo_sched_url",
@@ -47,73 +81,223 @@ class AutomationContainer:
             "bamboo_working_directory",
             "bamboo_github_access_password",
             "bamboo_s3_session_id"]
-        self.env = self.get_environment_variables(
-            self.accepted_variables)
+        if env is None:
+            env = self.get_environment_variables(self.accepted_variables)
+        self.env = env
+        if not run:
+            return
         if (self.env["bamboo_sched_url"] and
             self.env["bamboo_sched_password"] and
                 self.env["bamboo_connect_uid"]):
-            # Instantiate the SchedDataInterface which is used by other modules for the data source
-            self.sched_data_interface = SchedDataInterface(
-                self.env["bamboo_sched_url"],
-                self.env["bamboo_sched_password"],
-                self.env["bamboo_connect_uid"])
-            self.json_data = self.sched_data_interface.getSessionsData()
-            # Instantiate the ConnectJSONUpdater module
-            self.s3_interface = ConnectJSONUpdater(
-                "static-linaro-org", "connect/{}/".format(self.env["bamboo_connect_uid"].lower()), self.json_data, self.work_directory)
             # Run the main logic method (daily-tasks or upload-video)
             self.main()
         else:
             print(
                 "Missing bamboo_sched_url, bamboo_sched_password and bamboo_connect_uid environment variables")
 
-    def assume_role(self, arn, session_name):
+    def get_dependency(self, name, factory):
+        """
+        Returns a dependency, constructing it with factory and timing it on first use. Only callers
+        of the same dependency wait for its factory, e.g the Sched fetch doesn't wait for a git clone.
+        """
+        with self.dependencies_lock:
+            if name in self.dependencies:
+                return self.dependencies[name]
+            dependency_lock = self.dependency_locks.setdefault(name, threading.Lock())
+        with dependency_lock:
+            with self.dependencies_lock:
+                if name in self.dependencies:
+                    return self.dependencies[name]
+            start_time = time.time()
+            with self.run_report.stage("init_{}".format(name)):
+                dependency = factory()
+            with self.dependencies_lock:
+                self.dependencies[name] = dependency
+            self.startup_times[name] = time.time() - start_time
+            print("Initialised {} in {:.2f} seconds.".format(name, self.startup_times[name]))
+            return dependency
+
+    @property
+    def credential_broker(self):
+        """Caches the Vault login, secrets and the assumed role's STS credentials for the process"""
+        def create_credential_broker():
+            from credential_broker import CredentialBroker
+            return CredentialBroker(VAULT_URL, VAULT_ROLE, self.role_arn, self.role_session_name)
+        return self.get_dependency("credential_broker", create_credential_broker)
 
-        client = boto3.client('sts')
-        access = client.assume_role(
-            RoleArn=arn,
-            RoleSessionName=session_name
-            )
-        access_key = access["Credentials"]["AccessKeyId"]
-        secret_access_key = access["Credentials"]["SecretAccessKey"]
-        session_token = access["Credentials"]["SessionToken"]
+    @property
+    def sched_data_interface(self):
+        """The SchedDataInterface which is used by other modules for the data source"""
+        def create_sched_data_interface():
+            from sched_data_interface import SchedDataInterface
+            return SchedDataInterface(
+                self.env["bamboo_sched_url"],
+                self.env["bamboo_sched_password"],
+                self.env["bamboo_connect_uid"])
+        return self.get_dependency("sched_data_interface", create_sched_data_interface)
 
-        os.environ["AWS_ACCESS_KEY_ID"] = access_key
-        os.environ["AWS_SECRET_ACCESS_KEY"] = secret_access_key
-        os.environ["AWS_SESSION_TOKEN"] = session_token
+    @property
+    def sched_snapshot(self):
+        return self.get_dependency("sched_snapshot", lambda: SchedSnapshot(
+            self.sched_data_interface,
+            "{}sched/{}-sessions.json".format(self.work_directory, self.env["bamboo_connect_uid"].lower()),
+            self.args.sched_max_age))
 
-        return True
+    @property
+    def json_data(self):
+        return self.get_dependency("sched_data", lambda: self.sched_snapshot.load())
+
+    @property
+    def session_data(self):
+        """The sessions this run works on, i.e only the targeted sessions with --update-session"""
+        if self.target_session_ids is None:
+            return self.json_data
+        return dict((key, session) for key, session in self.json_data.items()
+                    if session["session_id"].upper() in self.target_session_ids)
+
+    @property
+    def s3_sync(self):
+        def create_s3_sync():
+            return S3SyncManager(self.static_bucket, session=self.credential_broker.get_boto3_session())
+        return self.get_dependency("s3_sync", create_s3_sync)
+
+    @property
+    def resources_capture(self):
+        """Captures the ConnectJSONUpdater's upload of resources.json so it can be published gzipped"""
+        def create_resources_capture():
+            from resources_publisher import ResourcesCapture
+            return ResourcesCapture(self.static_bucket, "connect/{}/resources.json".format(
+                self.env["bamboo_connect_uid"].lower()))
+        return self.get_dependency("resources_capture", create_resources_capture)
+
+    @property
+    def s3_interface(self):
+        """The ConnectJSONUpdater which builds the resources.json file"""
+        def create_s3_interface():
+            import boto3
+            from connect_json_updater import ConnectJSONUpdater
+            # The updater's boto3 clients come from the default session, which uses the broker's
+            # refreshing credentials and hands its resources.json upload to the capture
+            session = self.credential_broker.get_boto3_session()
+            self.resources_capture.register(session)
+            boto3.DEFAULT_SESSION = session
+            return ConnectJSONUpdater(
+                self.static_bucket, "connect/{}/".format(self.env["bamboo_connect_uid"].lower()), self.json_data, self.work_directory)
+        return self.get_dependency("s3_interface", create_s3_interface)
+
+    @property
+    def cloudfront_manager(self):
+        def create_cloudfront_manager():
+            return CloudFrontManager(
+                self.cloudfront_distribution_id, wildcard_threshold=self.args.invalidation_threshold,
+                session=self.credential_broker.get_boto3_session())
+        return self.get_dependency("cloudfront_manager", create_cloudfront_manager)
+
+    def report_startup_time(self, mode):
+        """Prints how long the process took to get to running the given mode"""
+        self.run_report.startup_seconds = round(time.time() - PROCESS_START_TIME, 4)
+        print("Started {} in {:.2f} seconds.".format(mode, self.run_report.startup_seconds))
 
     def main(self):
         """Takes the argparse arguments as input and starts scripts"""
 
         print("Linaro Connect Automation Container")
-        if self.args.upload_video:
+        if self.args.worker:
+            self.report_startup_time("--worker")
+            self.run_worker()
+        elif self.args.upload_video and (self.args.session_ids or self.args.discover_videos):
+            self.report_startup_time("--upload-video (batch)")
+            self.upload_videos(self.args.session_ids)
+        elif self.args.upload_video:
+            self.report_startup_time("--upload-video")
             self.upload_video(
                 self.env["bamboo_s3_session_id"])
         elif self.args.daily_tasks:
+            self.report_startup_time("--daily-tasks")
             self.daily_tasks()
         elif self.args.update_session:
+            self.report_startup_time("--update-session")
             self.update_sessions()
         elif self.args.social_images:
+            self.report_startup_time("--social-images")
             self.social_media_images()
         elif self.args.upload_presentations:
+            self.report_startup_time("--upload-presentations")
             self.update_presentations(
                 "{}presentations/".format(self.work_directory), "{}other_files/".format(self.work_directory))
         else:
             print("Please provide either the --upload-video or --daily-tasks flag ")
 
-    def update_sessions(self):
+    def run_worker(self):
+        """
+        Runs as a resident worker which takes jobs from the HTTP endpoint one at a time, so that the
+        website checkout, credentials and Sched snapshot stay warm between triggers.
+        """
+        from job_queue import JobQueue, create_worker_server
+        job_queue = JobQueue()
+        server = create_worker_server(job_queue, self.args.worker_host, self.args.worker_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print("Worker listening on http://{}:{}/jobs".format(self.args.worker_host, self.args.worker_port))
+        try:
+            while True:
+                job = job_queue.next_job()
+                job_queue.complete(job, self.run_job(job))
+        except KeyboardInterrupt:
+            print("Worker stopping...")
+        finally:
+            server.shutdown()
+
+    def reset_for_job(self):
+        """Clears the per-run state while keeping the warm dependencies for the next job"""
+        self.run_report = RunReport(
+            "{}run_report.json".format(self.work_directory), self.args.profile_stage)
+        self.target_session_ids = None
+        self.resources_json_changed = False
+        with self.dependencies_lock:
+            # Reloaded from the warm snapshot so each job sees the latest Sched export
+            self.dependencies.pop("sched_data", None)
+            # The ConnectJSONUpdater holds the session data it was created with
+            self.dependencies.pop("s3_interface", None)
+        # The S3 and CloudFront clients are kept, their credentials come from the credential
+        # broker's session which assumes the role again before the STS credentials expire
+        if "s3_sync" in self.dependencies:
+            self.s3_sync.uploaded_keys = []
+            self.s3_sync.uploaded_bytes = 0
+
+    def run_job(self, job):
+        """Runs a queued job, returning its exit code"""
+        self.reset_for_job()
+        print("Running job {} ({}, {} triggers)...".format(job.job_id, job.job_type, job.triggers))
+        try:
+            if job.job_type == "daily_tasks":
+                self.daily_tasks()
+            elif job.job_type == "update_session":
+                self.update_sessions(job.params["event_keys"])
+            elif job.job_type == "upload_video":
+                self.upload_videos(job.params["session_ids"])
+            return 0
+        except SystemExit as e:
+            # The modes exit on failure, which mustn't stop the worker
+            if e.code is None:
+                return 0
+            return e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print("ERROR: Job {} failed - {}".format(job.job_id, e))
+            return 1
+
+    @instrumented("update_sessions")
+    def update_sessions(self, event_keys=None):
         """This runs when the flag --update-session is set."""
         start_time = time.time()
-        self.event_keys = json.loads(self.env["bamboo_event_keys"])
-        for event_key in self.event_keys:
-            print(event_key)
+        if event_keys is None:
+            event_keys = json.loads(self.env["bamboo_event_keys"])
+        self.event_keys = event_keys
+        # Restrict every stage to the sessions in the webhook rather than the whole event
+        self.target_session_ids = self.resolve_target_session_ids(self.event_keys)
+        print("Updating sessions: {}".format(", ".join(sorted(self.target_session_ids))))
         # Updated the Jekyll Posts.
-        self.github_manager = self.setup_github_manager()
+        self.setup_website()
         print("Updating Jekyll Posts...")
-        self.post_tool = JekyllPostTool(
-            {"output": "{}website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())}, verbose=True)
         updated_posts = self.update_jekyll_posts()
         if updated_posts:
             created_social_media_images = self.social_media_images()
@@ -123,7 +307,7 @@ class AutomationContainer:
                     "{}presentations/".format(self.work_directory), "{}other_files/".format(self.work_directory))
                 if updated_presentations:
                     print("Updating the resources.json file...")
-                    updated_resources_json = self.s3_interface.update()
+                    updated_resources_json = self.update_resources_json()
                     if updated_resources_json:
                         print("resources.json file updated...")
                         end_time = time.time()
@@ -137,6 +321,22 @@ class AutomationContainer:
         else:
             sys.exit(1)
 
+    def resolve_target_session_ids(self, event_keys):
+        """
+        Maps the event keys from Sched to upper case session ids. Keys which don't match a
+        session in the latest export are kept as they are, so that removed sessions are deleted.
+        """
+        target_session_ids = set()
+        for event_key in event_keys:
+            event_key = str(event_key)
+            session_id = event_key.upper()
+            for key, session in self.json_data.items():
+                if event_key in [key, session["session_id"], session.get("event_key")]:
+                    session_id = session["session_id"].upper()
+                    break
+            target_session_ids.add(session_id)
+        return target_session_ids
+
     def get_environment_variables(self, accepted_variables):
         """Gets an environment variables that have been set i.e bamboo_sched_password"""
         found_variables = {}
@@ -147,15 +347,11 @@ class AutomationContainer:
         return found_variables
 
     def get_vault_secret(self, secret_path):
-        secret = vault_auth.get_secret(
-            secret_path,
-            iam_role=VAULT_ROLE,
-            url=VAULT_URL
-        )
+        secret = self.credential_broker.get_secret(secret_path)
         return secret["data"]["pw"]
 
     def get_secret_from_vault(self, vault_path, output_file_name):
-        """Used to retrive a secret json file from the linaro-its vault_auth module"""
+        """Used to retrive a secret json file from Vault"""
 
         secret_output_path = self.work_directory
 
@@ -167,6 +363,7 @@ class AutomationContainer:
                 file.write(secret)
         return secret_output_path, output_file_name
 
+    @instrumented("upload_video")
     def upload_video(self, session_id):
         """Handles the upload of a video"""
         if (self.env["bamboo_sched_url"] and
@@ -174,31 +371,152 @@ class AutomationContainer:
             self.env["bamboo_working_directory"] and
             self.env["bamboo_s3_session_id"] and
                 self.env["bamboo_connect_uid"]):
-            secrets_path, secrets_file_name = self.get_secret_from_vault(
-                "secret/misc/connect_google_secret.json", "youtube_secret.json")
-            video_manager = ConnectYoutubeUploader(secrets_path, secrets_file_name)
-            video_path = video_manager.download_video("{}/connect/{}/videos/{}.mp4".format(self.cdn_url, self.env["bamboo_connect_uid"].lower(), session_id.lower()),
-                             "{}videos/".format(self.work_directory))
-            # Get the session data for the given session id
-            session_data = self.json_data[session_id.upper()]
-            # Create the speakers portion of the YouTube video description
-            session_speakers_description = ""
-            for speaker in session_data["speakers"]:
-                speaker_role = ""
-                if speaker["company"] != "" and speaker["position"] != "":
-                    speaker_role = f"{speaker['position']} at {speaker['company']}"
-                elif speaker["company"] != "":
-                    speaker_role = speaker['company']
-                elif speaker["position"] != "":
-                    speaker_role = speaker['position']
-                session_speakers_description += f"{speaker['name']} - {speaker_role} \n {speaker['about']}"
-            # Set the session_abstract for the youtube video description
-            session_abstract = session_data["description"].replace("<br>","\n").replace("<br/>", "\n")
-            # Craft the session url
-            connect_website_url = "https://connect.linaro.org/resources/{}/session/{}/".format(
-                self.env["bamboo_connect_uid"].lower(), session_id.lower())
-            # Format the complete video description
-            video_description = """Session Abstract
+            video_manager = self.get_video_manager()
+            video_id = self.upload_session_video(video_manager, session_id)
+            self.set_session_thumbnail(video_manager, session_id, video_id)
+            youtube_url = f"https://https://www.youtube.com/watch?v={video_id}"
+            print(youtube_url)
+            print("Uploaded!")
+        else:
+            print("You're missing one of the required environment variables bamboo_sched_url, bamboo_sched_password, bamboo_connect_uid, bamboo_youtube_client_secret, bamboo_s3_session_id")
+
+    def get_video_manager(self):
+        """Returns a ConnectYoutubeUploader authenticated with the secret from the vault"""
+        secrets_path, secrets_file_name = self.get_secret_from_vault(
+            "secret/misc/connect_google_secret.json", "youtube_secret.json")
+        from connect_youtube_uploader import ConnectYoutubeUploader
+        return ConnectYoutubeUploader(secrets_path, secrets_file_name)
+
+    def upload_session_video(self, video_manager, session_id, youtube_lock=None):
+        """
+        Uploads a session's video from the CDN to YouTube, returning its video id. When
+        youtube_lock is given, calls on the shared video_manager are serialised with it.
+        """
+        youtube_lock = youtube_lock or threading.Lock()
+        video_url = "{}/connect/{}/videos/{}.mp4".format(self.cdn_url, self.env["bamboo_connect_uid"].lower(), session_id.lower())
+        videos_directory = "{}videos/".format(self.work_directory)
+        if not os.path.exists(videos_directory):
+            os.makedirs(videos_directory)
+        if self.args.stream_video:
+            video_options = self.get_video_options(session_id, None)
+            print("Streaming video for {} to YouTube ".format(session_id))
+            from video_streamer import get_thread_youtube_service, stream_video_to_youtube
+            video_id = stream_video_to_youtube(
+                get_thread_youtube_service(video_manager), video_url, video_options,
+                "{}{}.upload.json".format(videos_directory, session_id.lower()))
+        else:
+            video_path = video_manager.download_video(video_url, videos_directory)
+            video_options = self.get_video_options(session_id, video_path)
+            print("Uploading video for {} to YouTube ".format(session_id))
+            with youtube_lock:
+                video_id = video_manager.upload_video(video_options)
+            # Batch runs would otherwise keep a copy of every video in the work directory
+            if video_path and os.path.isfile(video_path):
+                os.remove(video_path)
+        return video_id
+
+    def set_session_thumbnail(self, video_manager, session_id, video_id, youtube_lock=None):
+        """Sets a session's social media image as the thumbnail of its uploaded video"""
+        with youtube_lock or threading.Lock():
+            video_manager.set_custom_thumbnail("{}images/{}.png".format(self.work_directory, session_id.upper()), video_id)
+
+    def discover_video_session_ids(self):
+        """Returns the ids of the sessions which have a video under connect/<uid>/videos/"""
+        uid = self.env["bamboo_connect_uid"].lower()
+        session_ids = []
+        for key in self.s3_sync.list_objects("connect/{}/videos/".format(uid)):
+            file_name = os.path.basename(key)
+            if file_name.lower().endswith(".mp4"):
+                session_ids.append(file_name[:-len(".mp4")].upper())
+        return sorted(session_ids)
+
+    @instrumented("upload_videos")
+    def upload_videos(self, session_ids):
+        """
+        Uploads the videos of several sessions with a bounded number of concurrent transfers,
+        sharing one authenticated uploader and one Sched snapshot. The status of each session is
+        written to a progress file so a re-run skips the videos that have already been uploaded,
+        and only sets the thumbnail of a video whose thumbnail failed.
+        """
+        session_ids = [session_id.upper() for session_id in session_ids or []]
+        if self.args.discover_videos:
+            session_ids = sorted(set(session_ids) | set(self.discover_video_session_ids()))
+        progress = Manifest("{}videos/{}-upload-progress.json".format(
+            self.work_directory, self.env["bamboo_connect_uid"].lower()))
+
+        def is_complete(session_id):
+            entry = progress.get(session_id) or {}
+            # Entries written before thumbnails had their own status were only saved once both were done
+            return entry.get("status") == "uploaded" and entry.get("thumbnail", "set") == "set"
+
+        pending_session_ids = [session_id for session_id in session_ids if not is_complete(session_id)]
+        print("{} of {} session videos to upload.".format(len(pending_session_ids), len(session_ids)))
+        if not pending_session_ids:
+            return True
+        video_manager = self.get_video_manager()
+        youtube_lock = threading.Lock()
+        progress_lock = threading.Lock()
+
+        def set_progress(session_id, status):
+            with progress_lock:
+                progress.set(session_id, status)
+                progress.save()
+
+        def upload(session_id):
+            if session_id not in self.json_data:
+                set_progress(session_id, {"status": "failed", "error": "Session not found in the Sched export"})
+                return
+            entry = progress.get(session_id) or {}
+            video_id = entry.get("video_id")
+            if entry.get("status") != "uploaded" or not video_id:
+                set_progress(session_id, {"status": "uploading"})
+                try:
+                    video_id = self.upload_session_video(video_manager, session_id, youtube_lock)
+                except Exception as e:
+                    set_progress(session_id, {"status": "failed", "error": "{}: {}".format(type(e).__name__, e)})
+                    print("ERROR: Failed to upload the video for {} - {}".format(session_id, e))
+                    return
+                # Saved straight away so a failed thumbnail never uploads the video again
+                set_progress(session_id, {"status": "uploaded", "video_id": video_id, "thumbnail": "pending"})
+                print("Uploaded {}: https://www.youtube.com/watch?v={}".format(session_id, video_id))
+            try:
+                self.set_session_thumbnail(video_manager, session_id, video_id, youtube_lock)
+                set_progress(session_id, {"status": "uploaded", "video_id": video_id, "thumbnail": "set"})
+            except Exception as e:
+                set_progress(session_id, {"status": "uploaded", "video_id": video_id, "thumbnail": "failed",
+                                          "error": "{}: {}".format(type(e).__name__, e)})
+                print("ERROR: Failed to set the thumbnail of {} ({}) - {}".format(session_id, video_id, e))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.args.video_workers)) as executor:
+            list(executor.map(upload, pending_session_ids))
+        failed_session_ids = [session_id for session_id in pending_session_ids if not is_complete(session_id)]
+        if failed_session_ids:
+            print("Failed to upload videos or thumbnails for: {}".format(", ".join(failed_session_ids)))
+            sys.exit(1)
+        return True
+
+    def get_video_options(self, session_id, video_path):
+        """Returns the YouTube upload payload for a session's video"""
+        # Get the session data for the given session id
+        session_data = self.json_data[session_id.upper()]
+        # Create the speakers portion of the YouTube video description
+        session_speakers_description = ""
+        for speaker in session_data["speakers"]:
+            speaker_role = ""
+            if speaker["company"] != "" and speaker["position"] != "":
+                speaker_role = f"{speaker['position']} at {speaker['company']}"
+            elif speaker["company"] != "":
+                speaker_role = speaker['company']
+            elif speaker["position"] != "":
+                speaker_role = speaker['position']
+            session_speakers_description += f"{speaker['name']} - {speaker_role} \n {speaker['about']}"
+        # Set the session_abstract for the youtube video description
+        session_abstract = session_data["description"].replace("<br>","\n").replace("<br/>", "\n")
+        # Craft the session url
+        connect_website_url = "https://connect.linaro.org/resources/{}/session/{}/".format(
+            self.env["bamboo_connect_uid"].lower(), session_id.lower())
+        # Format the complete video description
+        video_description = """Session Abstract
 
             {}
 
@@ -210,35 +528,27 @@ class AutomationContainer:
 
             {}
             """.format(session_abstract, session_speakers_description, connect_website_url)
-            # Setup the upload payload object
-            video_options={
-                "file": video_path,
-                        "title": session_data["name"],
-                        "description": video_description,
-                        "tags": "bud20,Open Source,Arm, budapest",
-                        "category": "28",
-                        "privacyStatus": "private"
-            }
-
-            print("Uploading video for {} to YouTube ".format(session_id))
-            video_id = video_manager.upload_video(video_options)
-            # Set the social media image path
-
-            thumbnail_set = video_manager.set_custom_thumbnail("{}images/{}.png".format(self.work_directory, session_id.upper()), video_id)
-            youtube_url = f"https://https://www.youtube.com/watch?v={video_id}"
-            print(youtube_url)
-            print("Uploaded!")
-        else:
-            print("You're missing one of the required environment variables bamboo_sched_url, bamboo_sched_password, bamboo_connect_uid, bamboo_youtube_client_secret, bamboo_s3_session_id")
+        # Setup the upload payload object
+        return {
+            "file": video_path,
+            "title": session_data["name"],
+            "description": video_description,
+            "tags": "bud20,Open Source,Arm, budapest",
+            "category": "28",
+            "privacyStatus": "private"
+        }
 
     def run_command(self, command):
         print("Executing: {}".format(command))
         # # Use Shlex to split the command for subprocess to handle stdout correctly.
         split_command = shlex.split(command)
 
+        start_time = time.perf_counter()
         process = subprocess.Popen(
             split_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
         output, err = process.communicate()
+        self.run_report.record_command(
+            command, time.perf_counter() - start_time, process.returncode, len(output))
         decoded_output = output.decode("utf-8")
         print(decoded_output)
         if process.returncode != 0:
@@ -250,36 +560,50 @@ class AutomationContainer:
             decoded_output = output.decode("utf-8")
             print(decoded_output)
 
+    @instrumented("resize_images")
     def generate_responsive_images(self, base_image_directory):
+        """Resizes the share images that are newer than their responsive JPEG versions"""
+        from image_resizer import resize_images
         print("Resizing social share images...")
-        try:
-            # For each width in widths, generated new JPEG images
-            for width in self.responsive_image_widths:
-                print("Resizing images to {} width...".format(str(width)))
-                if not os.path.exists(base_image_directory + str(width)):
-                    os.makedirs(base_image_directory + str(width))
-                # Use mogrify to generate JPG images of different sizes
-                self.run_command(
-                    "mogrify -path {1}{0}/ -resize {0} -format jpg {1}*.png".format(str(width), base_image_directory))
-            return True
-        except Exception as e:
-            print(e)
-            return True
+        source_paths = self.get_list_of_files_in_dir_based_on_ext(base_image_directory, ".png")
+        if self.target_session_ids is not None:
+            source_paths = [source_path for source_path in source_paths
+                            if has_name_prefix(os.path.basename(source_path), self.target_session_ids)]
+        self.resized_images, failed_images = resize_images(
+            source_paths, base_image_directory, self.responsive_image_widths, get_worker_count(self.args.image_workers))
+        print("Resized {} of {} images to {} widths.".format(
+            len(self.resized_images), len(source_paths), ", ".join(str(width) for width in self.responsive_image_widths)))
+        self.run_report.add(items=len(self.resized_images))
+        for source_path, error in failed_images.items():
+            print("ERROR: Failed to resize {} - {}".format(source_path, error))
+        return len(failed_images) == 0
+
+    def sync_to_s3(self, local_directory, prefix, filters):
+        """Syncs a directory to S3, adding the uploaded files and bytes to the run report"""
+        uploaded_bytes = self.s3_sync.uploaded_bytes
+        uploaded_keys = self.s3_sync.sync(local_directory, prefix, filters, self.target_session_ids)
+        self.run_report.add(items=len(uploaded_keys), bytes=self.s3_sync.uploaded_bytes - uploaded_bytes)
+        return uploaded_keys
+
+    @instrumented("upload_images")
     def upload_images_to_s3(self, base_image_directory):
         """Uploads responsive social media images generated images to s3"""
 
         print("Uploading generated social media share images to s3...")
         print("Syncing original PNG images...")
+        uid = self.env["bamboo_connect_uid"]
         try:
-            self.run_command("aws s3 sync --include '{3}-*.png' --include '{3}-*.jpg' --exclude '*.png' --exclude '*.jpg' {0} s3://{1}/connect/{2}/images/".format(
-                base_image_directory, self.static_bucket, self.env["bamboo_connect_uid"].lower(), self.env["bamboo_connect_uid"]))
+            self.sync_to_s3(
+                base_image_directory, "connect/{}/images/".format(uid.lower()),
+                [("exclude", "*"), ("include", "{}-*.png".format(uid)), ("include", "{}-*.jpg".format(uid))])
 
-            print("Uploading ImageMagick resized images...")
+            print("Uploading resized images...")
 
             for width in self.responsive_image_widths:
                 print("Syncing {} width images...".format(width))
-                self.run_command(
-                    "aws s3 sync --include '{4}-*.jpg' --exclude '*.jpg' {0}/{3}/ s3://{1}/connect/{2}/images/{3}/".format(base_image_directory, self.static_bucket, self.env["bamboo_connect_uid"].lower(), width, self.env["bamboo_connect_uid"]))
+                self.sync_to_s3(
+                    "{}{}/".format(base_image_directory, width), "connect/{}/images/{}/".format(uid.lower(), width),
+                    [("exclude", "*"), ("include", "{}-*.jpg".format(uid))])
                 print()
             return True
         except Exception as e:
@@ -292,96 +616,227 @@ class AutomationContainer:
         This method will download any new presentations from the Sched API using
         the SchedDataInterface and upload these to the static AWS S3 CDN bucket
         """
-        self.sched_presentation_tool = SchedPresentationTool(
-            presentation_directory, other_files_directory, self.json_data)
-        self.sched_presentation_tool.download()
+        if self.download_presentations(presentation_directory, other_files_directory):
+            return self.upload_presentations(presentation_directory, other_files_directory)
+        return False
+
+    @instrumented("presentations_download")
+    def download_presentations(self, presentation_directory, other_files_directory):
+        """Downloads any new or changed presentations and other files attached to the Sched sessions"""
+        from attachment_fetcher import AttachmentFetcher
+        self.attachment_fetcher = AttachmentFetcher(
+            presentation_directory, other_files_directory,
+            "{}manifests/{}-attachments.json".format(self.work_directory, self.env["bamboo_connect_uid"].lower()))
+        try:
+            changed_files, failed_files = self.attachment_fetcher.download(self.session_data)
+        finally:
+            self.attachment_fetcher.close()
+        self.run_report.add(items=len(changed_files), bytes=sum(os.path.getsize(path) for path in changed_files))
+        for url, error in failed_files.items():
+            print("ERROR: Failed to download {} - {}".format(url, error))
+        return len(failed_files) == 0
+
+    @instrumented("presentations_upload")
+    def upload_presentations(self, presentation_directory, other_files_directory):
+        """Uploads the changed presentations and other files to the static AWS S3 CDN bucket"""
         print("Uploading presentations to s3...")
         try:
             if not self.args.no_upload:
-                self.run_command(
-                    "aws s3 sync --exclude '*' --include '{3}-*.pdf'  {0} s3://{1}/connect/{2}/presentations/".format(presentation_directory, self.static_bucket, self.env["bamboo_connect_uid"].lower(), self.env["bamboo_connect_uid"]))
-                print("Uploading other files to s3...")
-                self.run_command(
-                    "aws s3 sync --exclude '*' --include '{3}-*'  {0} s3://{1}/connect/{2}/other_files/".format(other_files_directory, self.static_bucket, self.env["bamboo_connect_uid"].lower(), self.env["bamboo_connect_uid"]))
+                uid = self.env["bamboo_connect_uid"].lower()
+                uploads = []
+                for local_path in self.attachment_fetcher.get_pending_uploads():
+                    if os.path.dirname(local_path) == os.path.normpath(presentation_directory):
+                        key = "connect/{}/presentations/{}".format(uid, os.path.basename(local_path))
+                    else:
+                        key = "connect/{}/other_files/{}".format(uid, os.path.basename(local_path))
+                    uploads.append((local_path, key))
+                print("Uploading {} changed presentations and other files...".format(len(uploads)))
+                uploaded_bytes = self.s3_sync.uploaded_bytes
+                self.s3_sync.upload_files(uploads)
+                self.run_report.add(items=len(uploads), bytes=self.s3_sync.uploaded_bytes - uploaded_bytes)
+                self.attachment_fetcher.mark_uploaded([local_path for local_path, key in uploads])
             return True
         except Exception as e:
             print(e)
             return False
 
+    def setup_website(self):
+        """Sets up the GitHubManager and the JekyllPostTool which writes to the website checkout"""
+        from jekyll_post_tool import JekyllPostTool
+        if "github_manager" in self.dependencies:
+            # A resident worker brings its existing checkout up to date
+            self.github_manager.repo = self.github_manager.setup_repo()
+        else:
+            self.github_manager = self.get_dependency("github_manager", self.setup_github_manager)
+        self.post_tool = JekyllPostTool(
+            {"output": "{}website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())}, verbose=True)
+        return True
+
+    @instrumented("website_images")
+    def sync_images_to_website(self):
+        """Copies the share images into the website checkout"""
+        print("Syncing over share images to website directory...")
+        self.run_command("rsync -a --include '{}-*.png' --exclude 'circle_thumbs' --exclude '800' --exclude '300' --exclude '1200' --exclude 'images' --exclude '*.png'  {} {}".format(self.env["bamboo_connect_uid"], "{}images/".format(
+            self.work_directory), "{}website/assets/images/featured-images/{}/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())))
+        return True
+
+    @instrumented("daily_tasks")
     def daily_tasks(self):
-        """Handles the running of daily_tasks"""
+        """
+        Handles the running of daily_tasks. The tasks are run as a graph of stages so that
+        stages which don't depend on each other (e.g the website checkout, share images and
+        presentation downloads) run concurrently.
+        """
         start_time = time.time()
         print("Daily Connect Automation Tasks starting...")
-        self.github_manager = self.setup_github_manager()
-        print("Creating Jekyll Posts...")
-        self.post_tool = JekyllPostTool(
-            {"output": "{}website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())}, verbose=True)
-        print("Creating Social Media Share Images...")
-        created_social_media_images = self.social_media_images()
-        if created_social_media_images:
-            print("Syncing over share images to website directory...")
-            self.run_command("rsync -a --include '{}-*.png' --exclude 'circle_thumbs' --exclude '800' --exclude '300' --exclude '1200' --exclude 'images' --exclude '*.png'  {} {}".format(self.env["bamboo_connect_uid"], "{}images/".format(
-                self.work_directory), "{}website/assets/images/featured-images/{}/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())))
-            print("Creating GitHub pull request with changed Jekyll posts and images...")
-            updated_posts = self.update_jekyll_posts()
-            if updated_posts:
-                print("Updating session presentations...")
-                updated_presentations = self.update_presentations("{}presentations/".format(self.work_directory), "{}other_files/".format(self.work_directory))
-                if updated_presentations:
-                    print("Updating the resources.json file...")
-                    updated_resources_json = self.s3_interface.update()
-                    if updated_resources_json:
-                        print("resources.json file updated...")
-                        print("Invalidating static.linaro.org/connect/{}/* CloudFront cache...".format(self.env["bamboo_connect_uid"]))
-                        self.run_command(
-                            "aws cloudfront create-invalidation --distribution-id E374OER1SABFCK --paths '/connect/{}/*'".format(self.env["bamboo_connect_uid"]))
-                        end_time = time.time()
-                        print("Daily tasks complete in {} seconds.".format(end_time - start_time))
-                    else:
-                        print("Error with updating resources.json.")
-                        sys.exit(1)
-                else:
-                    print("Error with updating presentations.")
-                    sys.exit(1)
-            else:
-                print("Error with updating posts.")
-                sys.exit(1)
-        else:
-            print("Error with creating social media images.")
-            sys.exit(1)
+        presentation_directory = "{}presentations/".format(self.work_directory)
+        other_files_directory = "{}other_files/".format(self.work_directory)
+        stage_graph = StageGraph()
+        stage_graph.add("website_setup", self.setup_website)
+        stage_graph.add("social_images", self.social_media_images)
+        stage_graph.add("presentations_download",
+                        lambda: self.download_presentations(presentation_directory, other_files_directory))
+        stage_graph.add("website_images", self.sync_images_to_website, ["website_setup", "social_images"])
+        stage_graph.add("jekyll_posts", self.update_jekyll_posts, ["website_images"])
+        stage_graph.add("presentations_upload",
+                        lambda: self.upload_presentations(presentation_directory, other_files_directory),
+                        ["presentations_download"])
+        stage_graph.add("resources_json", self.update_resources_json, ["presentations_upload"])
+        stage_graph.add("cloudfront_invalidation", lambda: self.invalidate_changed_paths() or True,
+                        ["social_images", "jekyll_posts", "presentations_upload", "resources_json"])
+        failed_stage = stage_graph.run()
+        self.run_report.critical_path = stage_graph.print_summary()
+        if failed_stage:
+            print(self.stage_error_messages.get(
+                failed_stage.name, "Error with the {} stage.".format(failed_stage.name)))
+            sys.exit(failed_stage.exit_code if failed_stage.exit_code else 1)
+        end_time = time.time()
+        print("Daily tasks complete in {} seconds.".format(end_time - start_time))
+
+    @instrumented("resources_json")
+    def update_resources_json(self):
+        """
+        Builds the event's resources.json with the ConnectJSONUpdater and publishes it as gzipped,
+        deterministic JSON if it differs from the published version
+        """
+        from resources_publisher import ResourcesPublisher
+        key = "connect/{}/resources.json".format(self.env["bamboo_connect_uid"].lower())
+        with self.resources_capture.capturing() as capture:
+            if not self.s3_interface.update():
+                return False
+        if capture.content is None:
+            # The updater uploaded it itself, so it can't be compared, only invalidated
+            print("WARNING: The resources.json upload wasn't captured, it was published uncompressed.")
+            self.resources_json_changed = True
+            return True
+        publisher = ResourcesPublisher(self.static_bucket, key, self.s3_sync.client)
+        self.resources_json_changed = publisher.publish(json.loads(capture.content.decode("utf-8")))
+        if self.resources_json_changed:
+            self.run_report.add(items=1)
+        return True
+
+    @instrumented("cloudfront_invalidation")
+    def invalidate_changed_paths(self):
+        """Invalidates the CloudFront paths of the objects uploaded during this run"""
+        uid = self.env["bamboo_connect_uid"].lower()
+        changed_keys = list(self.s3_sync.uploaded_keys)
+        if self.resources_json_changed:
+            changed_keys.append("connect/{}/resources.json".format(uid))
+        print("Invalidating {} changed static.linaro.org/connect/{}/ paths in the CloudFront cache...".format(
+            len(changed_keys), uid))
+        self.cloudfront_manager.invalidate_keys(changed_keys, "/connect/{}/*".format(uid))
 
+    @instrumented("github_setup")
     def setup_github_manager(self):
         secret_output_path, output_file_name = self.get_secret_from_vault(
             "secret/misc/linaro-build-github.pem", "linaro-build-github.pem")
-        secret = vault_auth.get_secret(
-            "secret/github/linaro-build",
-            iam_role=VAULT_ROLE,
-            url=VAULT_URL
-        )
+        from github_manager import GitHubManager
+        secret = self.credential_broker.get_secret("secret/github/linaro-build")
         github_api_access_key =  secret["data"]["pat"]
-        print(github_api_access_key)
         full_ssh_path = secret_output_path + output_file_name
         self.run_command("chmod 400 {}".format(full_ssh_path))
+        sparse_paths = None
+        if self.args.sparse_checkout:
+            # The only parts of the website the automation writes to
+            sparse_paths = [
+                "_posts/{}/sessions".format(self.env["bamboo_connect_uid"].lower()),
+                "assets/images/featured-images/{}".format(self.env["bamboo_connect_uid"].lower())]
         github_manager = GitHubManager(
-            "https://github.com/linaro/connect", self.work_directory, full_ssh_path, github_api_access_key, self.github_reviewers, "{}-session-update".format(self.env["bamboo_connect_uid"].lower()))
+            "https://github.com/linaro/connect", self.work_directory, full_ssh_path, github_api_access_key, self.github_reviewers, "{}-session-update".format(self.env["bamboo_connect_uid"].lower()),
+            sparse_paths)
         return github_manager
 
     def escape_string(self, string):
         """Prevent XSS attacks"""
         return str(utils.escape(string))
 
+    def build_post_index(self, posts_directory, session_ids):
+        """
+        Builds an index of the existing session posts in one pass over the posts directory.
+        Returns a dict mapping the upper case session id to the post path.
+        """
+        post_index = {}
+        # Post file names are written as YYYY-MM-DD-<session_id>.md. A post is indexed when its
+        # name is a session in the export, or looks like a session id of this event, so that the
+        # posts of removed sessions can be deleted while other posts are never touched
+        post_name_regex = re.compile(r'^(?:[0-9]{4}-[0-9]{2}-[0-9]{2}-)?(.+)\.md$')
+        session_id_regex = re.compile(r'^{}-[a-z]*[0-9]+k*[0-9]*$'.format(
+            re.escape(self.env["bamboo_connect_uid"].lower())), re.IGNORECASE)
+        for post_path in self.get_list_of_files_in_dir_based_on_ext(posts_directory, ".md"):
+            match = post_name_regex.match(os.path.basename(post_path))
+            session_id = match.group(1).upper() if match else None
+            if session_id and (session_id in session_ids or session_id_regex.match(session_id)):
+                post_index[session_id] = post_path
+            else:
+                print("Skipping {} as its name isn't a session id".format(post_path))
+        return post_index
+
+    def load_post_frontmatter(self, post_path):
+        """Parses the frontmatter of an existing post"""
+        with open(post_path) as current_post:
+            return frontmatter.loads(current_post.read()).metadata
+
+    def get_post_manifest_entry(self, post_path, post_digest):
+        """Returns the manifest entry recording the rendered frontmatter digest of a post file"""
+        post_stat = os.stat(post_path)
+        return {
+            "digest": post_digest,
+            "path": post_path,
+            "size": post_stat.st_size,
+            "mtime": post_stat.st_mtime
+        }
+
+    def post_is_unchanged(self, manifest_entry, post_path, post_digest):
+        """
+        Checks the manifest entry for a post against the new frontmatter digest. The post
+        file is stat'ed so that posts changed outside of the automation are re-checked.
+        """
+        if not manifest_entry or manifest_entry["digest"] != post_digest or manifest_entry["path"] != post_path:
+            return False
+        try:
+            post_stat = os.stat(post_path)
+        except OSError:
+            return False
+        return post_stat.st_size == manifest_entry["size"] and post_stat.st_mtime == manifest_entry["mtime"]
+
+    @instrumented("jekyll_posts")
     def update_jekyll_posts(self):
 
-        current_posts = self.get_list_of_files_in_dir_based_on_ext("{}website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower()), ".md")
+        posts_directory = "{}website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower())
+        latest_session_ids = set(session_id.upper() for session_id in self.json_data.keys())
+        post_index = self.build_post_index(posts_directory, latest_session_ids)
+        post_manifest = Manifest("{}manifests/{}-posts.json".format(self.work_directory, self.env["bamboo_connect_uid"].lower()))
 
-        latest_session_ids = list(self.json_data.keys())
-        current_session_ids = self.get_current_session_ids_from_posts()
+        current_session_ids = set(post_index.keys())
 
         files_have_been_changed = False
+        # Paths written or deleted by this run, the only paths checked for changes and committed
+        changed_paths = set(["{}website/assets/images/featured-images/{}".format(
+            self.work_directory, self.env["bamboo_connect_uid"].lower())])
 
         current_date = datetime.datetime.now().strftime("%y%m%d-%H%M")
 
-        for session in self.json_data.values():
+        for session in self.session_data.values():
 
             session_image = "/assets/images/featured-images/{}/{}.png".format(self.env["bamboo_connect_uid"].lower(), session["session_id"])
             try:
@@ -430,31 +885,27 @@ class AutomationContainer:
                 "tag": "session",
             }
 
-            found = False
-            changed = False
-
             lower_case_session_id = session["session_id"].lower()
-            changed_post_path = ""
-
-            for current_post_path in current_posts:
-                if lower_case_session_id + ".md" in current_post_path:
-                    found = True
-                    # Load current front matter
-                    with open(current_post_path) as current_post:
-                        current_post_obj = frontmatter.loads(current_post.read())
-                        # Set the front matter
-                        front_matter = current_post_obj.metadata
-                        if front_matter != post_frontmatter:
-                            changed = True
-                            changed_post_path = current_post_path
-            if found:
-                if changed:
+            session_key = session["session_id"].upper()
+            current_post_path = post_index.get(session_key)
+            post_digest = content_digest(post_frontmatter)
+
+            if current_post_path:
+                # Skip parsing the post if the rendered frontmatter matches the last run
+                if self.post_is_unchanged(post_manifest.get(session_key), current_post_path, post_digest):
+                    continue
+                if self.load_post_frontmatter(current_post_path) != post_frontmatter:
                     files_have_been_changed = True
                     print("Updating post for {}".format(session["session_id"]))
                     post_file_name = datetime.datetime.now().strftime("%Y-%m-%d") + "-" + lower_case_session_id + ".md"
                     # Edit posts if file already exists
                     self.post_tool.write_post(
-                        post_frontmatter, "", post_file_name, changed_post_path)
+                        post_frontmatter, "", post_file_name, current_post_path)
+                    written_post_path = self.find_written_post(posts_directory, post_file_name, current_post_path)
+                    changed_paths.update([current_post_path, os.path.join(posts_directory, post_file_name)])
+                    self.run_report.add(items=1)
+                else:
+                    written_post_path = current_post_path
             else:
                 files_have_been_changed = True
                 print("Not found....")
@@ -463,26 +914,35 @@ class AutomationContainer:
                 post_file_name = datetime.datetime.now().strftime("%Y-%m-%d") + "-" + lower_case_session_id + ".md"
                  # Edit posts if file already exists
                 self.post_tool.write_post(post_frontmatter, "", post_file_name)
+                written_post_path = self.find_written_post(posts_directory, post_file_name)
+                changed_paths.add(os.path.join(posts_directory, post_file_name))
+                self.run_report.add(items=1)
+            if written_post_path:
+                post_manifest.set(session_key, self.get_post_manifest_entry(written_post_path, post_digest))
 
         # Delete sessions that don't exist in latest export
-        for current_session_id in current_session_ids:
-            # Check to see if a session has been removed and if so - delete it.
-            if current_session_id not in latest_session_ids:
-                files_have_been_changed = True
-                file_to_delete = self.get_list_of_files_in_dir_based_on_ext(
-                    "{}/website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower()), "{}.md".format(current_session_id.lower()))[0]
-                del_command = "rm {}".format(file_to_delete)
-                print(del_command)
-                self.run_command(del_command)
+        removed_session_ids = current_session_ids - latest_session_ids
+        if self.target_session_ids is not None:
+            removed_session_ids &= self.target_session_ids
+        for removed_session_id in sorted(removed_session_ids):
+            files_have_been_changed = True
+            file_to_delete = post_index[removed_session_id]
+            print("Deleting post for removed session {}: {}".format(removed_session_id, file_to_delete))
+            os.remove(file_to_delete)
+            changed_paths.add(file_to_delete)
+            post_manifest.remove(removed_session_id)
+
+        post_manifest.save()
 
-        for latest_session_id in latest_session_ids:
-            if latest_session_id not in current_session_ids:
-                print("New session detected: ".format(latest_session_id))
+        for new_session_id in sorted(latest_session_ids - current_session_ids):
+            print("New session detected: {}".format(new_session_id))
 
         # Commit and create the pull request
-        if self.github_manager.repo.is_dirty() or len(self.github_manager.repo.untracked_files) > 0:
+        if self.github_manager.has_changes(changed_paths):
             # Commit the local changes
-            committed = self.github_manager.commit_and_push_changes("Event updates as of {}".format(current_date))
+            with self.run_report.stage("git_push"):
+                committed = self.github_manager.commit_and_push_changes(
+                    "Event updates as of {}".format(current_date), changed_paths)
             # If committed successfully then attempt to create a pull request if neccessary
             if committed:
                 self.github_manager.create_pull_request("Connect Automation Updates", "Session posts updated by the Connect Automation Docker Container.")
@@ -493,6 +953,13 @@ class AutomationContainer:
             print("No changes to push!")
             return True
 
+    def find_written_post(self, posts_directory, post_file_name, current_post_path=None):
+        """Returns the path of a post written by the JekyllPostTool or None if it can't be found"""
+        for post_path in [os.path.join(posts_directory, post_file_name), current_post_path]:
+            if post_path and os.path.isfile(post_path):
+                return post_path
+        return None
+
     def get_list_of_files_in_dir_based_on_ext(self, folder, extension):
         file_list = []
         for file in os.listdir(folder):
@@ -500,58 +967,90 @@ class AutomationContainer:
                 file_list.append(os.path.join(folder, file))
         return file_list
 
-    def get_current_session_ids_from_posts(self):
-        file_list = self.get_list_of_files_in_dir_based_on_ext(
-            "{}/website/_posts/{}/sessions/".format(self.work_directory, self.env["bamboo_connect_uid"].lower()), ".md")
-
-        current_ids = []
-        for each in file_list:
-            # Get the first item found based on the regex
-            try:
-                # Get the first item found based on the regex
-                                # Check if we should delete
-                session_id_regex = re.compile(
-                    '{}-[A-Za-z]*[0-9]+k*[0-9]*'.format(self.env["bamboo_connect_uid"].lower()))
-                session_id = session_id_regex.findall(each)[0]
-                current_ids.append(session_id.upper())
-            # If no session ID exists then skip the session and output a warning
-            except Exception as e:
-                print(e)
-        return current_ids
-
+    @instrumented("social_images")
     def social_media_images(self):
-        self.social_image_generator = SocialImageGenerator(
-            {"output": "{}images/".format(self.work_directory), "template": "/app/assets/templates/{}-placeholder.jpg".format(self.env["bamboo_connect_uid"].lower()), "assets_path": "/app/assets/"})
+        self.social_image_generator_options = {
+            "output": "{}images/".format(self.work_directory),
+            "template": "{}templates/{}-placeholder.jpg".format(self.assets_directory, self.env["bamboo_connect_uid"].lower()),
+            "assets_path": self.assets_directory}
+        # Caches the template, fonts, circle masks and wrapped text across the images
+        self.social_image_generator = create_generator(self.social_image_generator_options)
         print("Generating Social Media Share Images...")
+        self.image_render_manifest = Manifest("{}manifests/{}-images.json".format(
+            self.work_directory, self.env["bamboo_connect_uid"].lower()))
         generated_images = self.generate_images()
         if generated_images:
-            generated_responsive_images = self.generate_responsive_images("{}images/".format(self.work_directory))
+            base_image_directory = "{}images/".format(self.work_directory)
+            generated_responsive_images = self.generate_responsive_images(base_image_directory)
             if generated_responsive_images:
+                # Always sync, S3SyncManager only uploads what differs, so images rendered
+                # during a --no-upload run are still uploaded by the next run
                 if self.args.no_upload != True:
-                    uploaded_images_to_s3 = self.upload_images_to_s3("{}images/".format(self.work_directory))
-                    if uploaded_images_to_s3:
-                        return True
-                    else:
+                    uploaded_images_to_s3 = self.upload_images_to_s3(base_image_directory)
+                    if not uploaded_images_to_s3:
                         return False
+                # Only remember the rendered images once they have been resized and uploaded
+                self.image_render_manifest.save()
                 return True
             else:
                 return False
         else:
             return False
 
+    def get_file_digest(self, file_path):
+        """Returns the sha256 hex digest of a file's contents, or None if it doesn't exist"""
+        file_hash = hashlib.sha256()
+        try:
+            with open(file_path, "rb") as digest_file:
+                for block in iter(lambda: digest_file.read(65536), b""):
+                    file_hash.update(block)
+        except OSError:
+            return None
+        return file_hash.hexdigest()
 
+    def get_image_render_digest(self, image_options, template_digest, avatar_digests):
+        """Returns the digest of everything that goes into rendering a share image"""
+        speaker_image = image_options["elements"]["images"][0]["image_name"]
+        if speaker_image not in avatar_digests:
+            avatar_digests[speaker_image] = self.get_file_digest(
+                os.path.join(self.social_image_generator_options["assets_path"], "images", speaker_image))
+        return content_digest({
+            "options": image_options,
+            "template": template_digest,
+            "avatar": avatar_digests[speaker_image]
+        })
+
+
+    def get_speaker_avatar_urls(self):
+        """Returns the avatar URLs of the first speaker of each session"""
+        avatar_urls = []
+        for session in self.session_data.values():
+            try:
+                speaker_avatar_url = session["speakers"][0]["avatar"].replace(".320x320px.jpg", "")
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if len(speaker_avatar_url) >= 3:
+                avatar_urls.append(speaker_avatar_url)
+        return avatar_urls
+
+    @instrumented("render_images")
     def generate_images(self):
 
-        for session in self.json_data.values():
+        from avatar_cache import AvatarCache
+        self.avatar_cache = AvatarCache(
+            "{}avatars/".format(self.work_directory),
+            os.path.join(self.social_image_generator_options["assets_path"], "images"))
+        # Start downloading every speaker avatar up front, each URL is only fetched once
+        self.avatar_cache.prefetch(self.get_speaker_avatar_urls())
+        image_options_list = []
+        for session in self.session_data.values():
             try:
                 speaker_avatar_url = session["speakers"][0]["avatar"].replace(
                     ".320x320px.jpg", "")
                 if len(speaker_avatar_url) < 3:
                     speaker_image = "placeholder.jpg"
                 else:
-                    file_name = self.social_image_generator.grab_photo(
-                        speaker_avatar_url, slugify(session["speakers"][0]["name"]))
-                    speaker_image = file_name
+                    speaker_image = self.avatar_cache.fetch(speaker_avatar_url).result()
                 session_speakers = session["speakers"][0]["name"]
             except Exception:
                 print("{} has no speakers".format(session["name"]))
@@ -559,113 +1058,61 @@ class AutomationContainer:
                 session_speakers = "TBC"
 
             # Create the image options dictionary
-            image_options = {
-                "file_name": session["session_id"],
-                "elements": {
-                    "images": [
-                        {
-                            "dimensions": {
-                                "x": 300,
-                                "y": 300
-                            },
-                            "position": {
-                                "x": 820,
-                                "y": 80
-                            },
-                            "image_name": speaker_image,
-                            "circle": "True"
-                        }
-                    ],
-                    "text": [
-                        {
-                            "multiline": "True",
-                            "centered": "True",
-                            "wrap_width": 28,
-                            "value": session_speakers,
-                            "position": {
-                                "x": [920, 970],
-                                "y": 400
-                            },
-                            "font": {
-                                "size": 32,
-                                "family": "fonts/Lato-Regular.ttf",
-                                "colour": {
-                                    "r": 255,
-                                    "g": 255,
-                                    "b": 255
-                                }
-                            }
-                        },
-                        {
-                            "multiline": "False",
-                            "centered": "False",
-                            "wrap_width": 28,
-                            "value": session["session_id"],
-                            "position": {
-                                "x": 80,
-                                "y": 140
-                            },
-                            "font": {
-                                "size": 48,
-                                "family": "fonts/Lato-Bold.ttf",
-                                "colour": {
-                                    "r": 255,
-                                    "g": 255,
-                                    "b": 255
-                                }
-                            }
-                        },
-                        {
-                            "multiline": "False",
-                            "centered": "False",
-                            "wrap_width": 28,
-                            "value": session["event_type"],
-                            "position": {
-                                "x": 80,
-                                "y": 200
-                            },
-                            "font": {
-                                "size": 28,
-                                "family": "fonts/Lato-Bold.ttf",
-                                "colour": {
-                                    "r": 255,
-                                    "g": 255,
-                                    "b": 255
-                                }
-                            }
-                        },
-                        {
-                            "multiline": "True",
-                            "centered": "False",
-                            "wrap_width": 28,
-                            "value": session["session_title"],
-                            "position": {
-                                "x": 80,
-                                "y": 240
-                            },
-                            "font": {
-                                "size": 48,
-                                "family": "fonts/Lato-Bold.ttf",
-                                "colour": {
-                                    "r": 255,
-                                    "g": 255,
-                                    "b": 255
-                                }
-                            }
-                        }
-                    ],
-                }
-            }
-            # Generate the image
-            self.social_image_generator.create_image(image_options)
+            image_options_list.append(get_image_options(
+                session["session_id"], session["event_type"], session["session_title"], speaker_image, session_speakers))
+        self.avatar_cache.close()
 
-        return True
+        # Skip images whose inputs haven't changed since they were last rendered
+        template_digest = self.get_file_digest(self.social_image_generator_options["template"])
+        avatar_digests = {}
+        render_digests = {}
+        changed_image_options = []
+        for image_options in image_options_list:
+            session_id = image_options["file_name"]
+            render_digest = self.get_image_render_digest(image_options, template_digest, avatar_digests)
+            output_path = "{}{}.png".format(self.social_image_generator_options["output"], session_id)
+            if self.image_render_manifest.get(session_id) == render_digest and os.path.isfile(output_path):
+                continue
+            render_digests[session_id] = render_digest
+            changed_image_options.append(image_options)
+        print("{} of {} share images need rendering.".format(len(changed_image_options), len(image_options_list)))
+
+        if self.args.image_workers == 1:
+            for image_options in changed_image_options:
+                # Generate the image
+                self.social_image_generator.create_image(image_options)
+            failed_images = {}
+        else:
+            print("Rendering {} images with {} workers...".format(
+                len(changed_image_options), get_worker_count(self.args.image_workers)))
+            from image_renderer import render_images
+            failed_images = render_images(
+                self.social_image_generator_options, changed_image_options, self.args.image_workers)
+            for file_name, error in failed_images.items():
+                print("ERROR: Failed to generate the share image for {} - {}".format(file_name, error))
+
+        self.run_report.add(items=len(changed_image_options))
+        self.changed_images = []
+        for image_options in changed_image_options:
+            session_id = image_options["file_name"]
+            if session_id not in failed_images:
+                self.changed_images.append(session_id)
+                self.image_render_manifest.set(session_id, render_digests[session_id])
+        return len(failed_images) == 0
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Connect Automation")
     parser.add_argument('--upload-video', action='store_true',
                         help='If specified, the video upload method is executed. Requires a -u arg with the session id.')
+    parser.add_argument('--stream-video', action='store_true',
+                        help='If specified with --upload-video, the video is streamed from the CDN to YouTube instead of being downloaded first.')
+    parser.add_argument('--session-ids', nargs='+',
+                        help='With --upload-video, uploads the videos of these sessions in one batch instead of bamboo_s3_session_id.')
+    parser.add_argument('--discover-videos', action='store_true',
+                        help='With --upload-video, uploads every session video found under connect/<uid>/videos/ in s3.')
+    parser.add_argument('--video-workers', type=int, default=2,
+                        help='Number of concurrent video transfers in batch mode. Defaults to 2.')
     parser.add_argument('--daily-tasks', action='store_true',
                         help='If specified, the daily Connect automation tasks are run.')
     parser.add_argument('--update-session', action='store_true',
@@ -674,6 +1121,22 @@ if __name__ == '__main__':
                         help='If specified, assets are not uploaded to s3.')
     parser.add_argument('--social-images', action='store_true',
                         help='If specified, only the social media share images task is executed.')
+    parser.add_argument('--image-workers', type=int, default=1,
+                        help='Number of processes used to render social media share images. Defaults to 1 (serial), 0 uses one per CPU.')
+    parser.add_argument('--invalidation-threshold', type=int, default=DEFAULT_INVALIDATION_THRESHOLD,
+                        help='If more paths than this have changed, the whole event is invalidated in CloudFront with a wildcard.')
+    parser.add_argument('--sched-max-age', type=int, default=0,
+                        help='Reuse the saved Sched export if it was fetched less than this many seconds ago. Defaults to 0 (always fetch).')
+    parser.add_argument('--profile-stage',
+                        help='Name of a run report stage (e.g. render_images) to profile with cProfile.')
+    parser.add_argument('--sparse-checkout', action='store_true',
+                        help='If specified, the website repo is a shallow, sparse clone of just the event\'s posts and featured images.')
+    parser.add_argument('--worker', action='store_true',
+                        help='If specified, runs as a resident worker taking daily_tasks, update_session and upload_video jobs over HTTP.')
+    parser.add_argument('--worker-host', default='127.0.0.1',
+                        help='Address the worker listens on. Defaults to 127.0.0.1, use 0.0.0.0 to reach it through docker run -p.')
+    parser.add_argument('--worker-port', type=int, default=8080,
+                        help='Port the worker listens on. Defaults to 8080.')
     parser.add_argument('--jekyll-posts', action='store_true',
                         help='If specified, only the social media share images task is executed.')
     parser.add_argument('--upload-presentations', action='store_true',
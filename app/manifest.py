@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+
+def content_digest(data):
+    """Returns a sha256 hex digest of the canonical JSON representation of data"""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """
+    A JSON dictionary persisted in the working directory which is used to remember
+    state between runs of the container.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.changed = False
+        self.entries = self.load()
+
+    def load(self):
+        """Loads the manifest, starting with an empty one if it is missing or unreadable"""
+        try:
+            with open(self.manifest_path) as manifest_file:
+                entries = json.load(manifest_file)
+            if isinstance(entries, dict):
+                return entries
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+
+    def set(self, key, value):
+        if self.entries.get(key) != value:
+            self.entries[key] = value
+            self.changed = True
+
+    def remove(self, key):
+        if key in self.entries:
+            del self.entries[key]
+            self.changed = True
+
+    def keys(self):
+        return list(self.entries.keys())
+
+    def save(self):
+        """Writes the manifest atomically if any entries have changed"""
+        if not self.changed:
+            return False
+        manifest_directory = os.path.dirname(self.manifest_path)
+        if manifest_directory and not os.path.exists(manifest_directory):
+            os.makedirs(manifest_directory)
+        temp_path = "{}.tmp".format(self.manifest_path)
+        with open(temp_path, "w") as manifest_file:
+            json.dump(self.entries, manifest_file, sort_keys=True, indent=1)
+        os.replace(temp_path, self.manifest_path)
+        self.changed = False
+        return True
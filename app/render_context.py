@@ -0,0 +1,174 @@
+import importlib.util
+import os
+import sys
+import textwrap
+import threading
+from collections import OrderedDict
+
+
+class ModuleProxy:
+    """Stands in for a module, with some of its attributes replaced"""
+
+    def __init__(self, module, **overrides):
+        self._module = module
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+class MaskDraw:
+    """
+    Wraps an ImageDraw.Draw so that an ellipse drawn onto a blank mask, e.g the circle mask of a
+    speaker image, is copied from the RenderContext's mask cache rather than rasterized again
+    """
+
+    def __init__(self, render_context, image, draw):
+        self.render_context = render_context
+        self.image = image
+        self.draw = draw
+
+    def __getattr__(self, name):
+        return getattr(self.draw, name)
+
+    def ellipse(self, xy, fill=None, outline=None, **kwargs):
+        if outline is None and not kwargs and self.image.mode in ["1", "L"] and self.image.getbbox() is None:
+            try:
+                key = (self.image.mode, self.image.size, tuple(tuple(point) if isinstance(point, list) else point
+                                                               for point in xy), fill)
+                hash(key)
+            except TypeError:
+                key = None
+            if key is not None:
+                self.image.paste(self.render_context.get_mask(key, lambda: self.draw_mask(xy, fill)))
+                return
+        return self.draw.ellipse(xy, fill, outline, **kwargs)
+
+    def draw_mask(self, xy, fill):
+        mask = self.render_context.modules["Image"].new(self.image.mode, self.image.size, 0)
+        self.render_context.modules["ImageDraw"].Draw(mask).ellipse(xy, fill)
+        return mask
+
+
+class RenderContext:
+    """
+    Caches the expensive, repeated parts of rendering share images with the SocialImageGenerator.
+    Generators created by create_generator run from a private copy of the generator's module,
+    whose PIL and textwrap names are proxies: the template is decoded once and every Image.open
+    of it returns a copy of the decoded image, ImageFont.truetype faces are kept per (font, size),
+    circle masks and textwrap.wrap results are memoized. PIL and textwrap themselves, and the
+    imported generator module, are left untouched. The caches are LRUs so a long lived worker
+    doesn't grow without bound.
+    """
+
+    def __init__(self, template_path, max_fonts=32, max_wrapped_text=4096, max_masks=16):
+        from PIL import Image, ImageDraw, ImageFont
+        self.template_path = os.path.abspath(template_path)
+        self.template = None
+        self.template_stat = None
+        self.modules = {"Image": Image, "ImageDraw": ImageDraw, "ImageFont": ImageFont}
+        self.fonts = OrderedDict()
+        self.max_fonts = max_fonts
+        self.wrapped_text = OrderedDict()
+        self.max_wrapped_text = max_wrapped_text
+        self.masks = OrderedDict()
+        self.max_masks = max_masks
+        self.lock = threading.Lock()
+        # Generator module name -> private copy of the module
+        self.generator_modules = {}
+
+    def create_generator(self, generator_class, *args, **kwargs):
+        """
+        Returns an instance of generator_class, created from a private copy of its module so that
+        it renders through the caches. Falls back to the class itself if its module can't be loaded
+        again.
+        """
+        module = sys.modules[generator_class.__module__]
+        if module.__name__ not in self.generator_modules:
+            spec = importlib.util.find_spec(module.__name__)
+            if spec is None or spec.loader is None:
+                print("WARNING: Can't load {} again, rendering without the render caches.".format(module.__name__))
+                self.generator_modules[module.__name__] = module
+            else:
+                private_module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(private_module)
+                self.bind(private_module)
+                self.generator_modules[module.__name__] = private_module
+        return getattr(self.generator_modules[module.__name__], generator_class.__name__)(*args, **kwargs)
+
+    def bind(self, module):
+        """Points the module's PIL and textwrap names, however they were imported, at the cached versions"""
+        import PIL
+        Image, ImageDraw, ImageFont = self.modules["Image"], self.modules["ImageDraw"], self.modules["ImageFont"]
+        image_proxy = ModuleProxy(Image, open=self.open)
+        image_draw_proxy = ModuleProxy(ImageDraw, Draw=self.draw)
+        image_font_proxy = ModuleProxy(ImageFont, truetype=self.truetype)
+        replacements = [
+            (PIL, ModuleProxy(PIL, Image=image_proxy, ImageDraw=image_draw_proxy, ImageFont=image_font_proxy)),
+            (Image, image_proxy),
+            (ImageDraw, image_draw_proxy),
+            (ImageFont, image_font_proxy),
+            (textwrap, ModuleProxy(textwrap, wrap=self.wrap)),
+            (Image.open, self.open),
+            (ImageDraw.Draw, self.draw),
+            (ImageFont.truetype, self.truetype),
+            (textwrap.wrap, self.wrap)
+        ]
+        for name, value in list(vars(module).items()):
+            for original, replacement in replacements:
+                if value is original:
+                    setattr(module, name, replacement)
+
+    def load_template(self):
+        """Decodes the template, again only if the file has changed since it was last decoded"""
+        stat = os.stat(self.template_path)
+        template_stat = (stat.st_mtime, stat.st_size)
+        if self.template is None or self.template_stat != template_stat:
+            template = self.modules["Image"].open(self.template_path)
+            template.load()
+            self.template = template
+            self.template_stat = template_stat
+        return self.template
+
+    def open(self, fp, mode="r", *args, **kwargs):
+        if mode == "r" and isinstance(fp, str) and os.path.abspath(fp) == self.template_path:
+            template = self.load_template()
+            image = template.copy()
+            image.format = template.format
+            image.filename = getattr(template, "filename", "")
+            return image
+        return self.modules["Image"].open(fp, mode, *args, **kwargs)
+
+    def draw(self, image, *args, **kwargs):
+        return MaskDraw(self, image, self.modules["ImageDraw"].Draw(image, *args, **kwargs))
+
+    def get_cached(self, cache, max_size, key, create):
+        """Returns cache[key], creating it and evicting the least recently used entry when full"""
+        try:
+            with self.lock:
+                value = cache.get(key)
+                if value is not None:
+                    cache.move_to_end(key)
+                    return value
+        except TypeError:
+            # e.g a file object rather than a path
+            return create()
+        value = create()
+        with self.lock:
+            cache[key] = value
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+        return value
+
+    def get_mask(self, key, create):
+        return self.get_cached(self.masks, self.max_masks, key, create)
+
+    def truetype(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        return self.get_cached(self.fonts, self.max_fonts, key,
+                               lambda: self.modules["ImageFont"].truetype(*args, **kwargs))
+
+    def wrap(self, text, width=70, **kwargs):
+        key = (text, width, tuple(sorted(kwargs.items())))
+        return list(self.get_cached(self.wrapped_text, self.max_wrapped_text, key,
+                                    lambda: textwrap.wrap(text, width, **kwargs)))
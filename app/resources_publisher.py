@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+
+
+class ResourcesCapture:
+    """
+    Captures the resources.json upload made by the ConnectJSONUpdater so that the document it
+    built can be published by the ResourcesPublisher instead. While capturing, a PutObject of the
+    key made by a client of a registered boto3 session isn't sent to S3, its body is kept.
+    """
+
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+        self.lock = threading.Lock()
+        self.active = False
+        self.content = None
+
+    def register(self, session):
+        """Registers the capture with a boto3 session, clients created from it afterwards use it"""
+        session.events.register("before-parameter-build.s3.PutObject", self.before_parameter_build,
+                                unique_id="resources-capture-params-{}".format(id(self)))
+        session.events.register("before-call.s3.PutObject", self.before_call,
+                                unique_id="resources-capture-call-{}".format(id(self)))
+
+    @contextmanager
+    def capturing(self):
+        with self.lock:
+            self.active = True
+            self.content = None
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.active = False
+
+    def before_parameter_build(self, params, context, **kwargs):
+        with self.lock:
+            if not self.active or params.get("Bucket") != self.bucket or params.get("Key") != self.key:
+                return
+        body = params.get("Body") or b""
+        if hasattr(body, "read"):
+            position = body.tell() if hasattr(body, "tell") else None
+            content = body.read()
+            if position is not None:
+                body.seek(position)
+            body = content
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        with self.lock:
+            self.content = bytes(body)
+        context["resources_capture"] = True
+
+    def before_call(self, context, **kwargs):
+        """Answers a captured PutObject without sending it"""
+        if not context.get("resources_capture"):
+            return None
+        from botocore.awsrequest import AWSResponse
+        return AWSResponse(None, 200, {}, None), {"ETag": '"{}"'.format(hashlib.md5(self.content).hexdigest())}
+
+
+class ResourcesPublisher:
+    """
+    Publishes an event's resources.json as deterministic, gzip precompressed JSON. The sha256
+    of the content is stored in the object's metadata, so a document which is the same as the
+    published one is neither uploaded nor invalidated.
+    """
+
+    def __init__(self, bucket, key, client, cache_control="public, max-age=300"):
+        self.bucket = bucket
+        self.key = key
+        self.client = client
+        self.cache_control = cache_control
+
+    @staticmethod
+    def serialize(document):
+        """Serializes the document so the same data always produces the same bytes"""
+        return json.dumps(document, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def get_published_digest(self):
+        """Returns the sha256 of the published content, or None if it doesn't exist or has no digest"""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key).get("Metadata", {}).get("sha256")
+        except Exception:
+            return None
+
+    def publish(self, document):
+        """Uploads the document gzip compressed if it differs from the published one, returning True if it did"""
+        content = self.serialize(document)
+        content_digest = hashlib.sha256(content).hexdigest()
+        if self.get_published_digest() == content_digest:
+            print("s3://{}/{} is up to date.".format(self.bucket, self.key))
+            return False
+        # mtime=0 keeps the compressed bytes (and so the ETag) stable for the same content
+        compressed_content = gzip.compress(content, compresslevel=9, mtime=0)
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=compressed_content,
+            ContentType="application/json",
+            ContentEncoding="gzip",
+            CacheControl=self.cache_control,
+            Metadata={"sha256": content_digest})
+        print("Published s3://{}/{} ({} bytes, {} gzipped)".format(
+            self.bucket, self.key, len(content), len(compressed_content)))
+        return True
@@ -0,0 +1,145 @@
+import cProfile
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage CPU time is measured for the calling thread where the platform supports it
+THREAD_USAGE = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+
+
+def get_peak_rss_kb():
+    """Returns the peak resident set size of this process and its children in KB"""
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def get_cpu_times(who=resource.RUSAGE_SELF):
+    """Returns the user + system CPU seconds used by this process (or thread) and by its waited-for children"""
+    own_usage = resource.getrusage(who)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (own_usage.ru_utime + own_usage.ru_stime,
+            children_usage.ru_utime + children_usage.ru_stime)
+
+
+class RunReport:
+    """
+    Records wall time, CPU time, peak RSS, item counts and bytes transferred for each stage of
+    a run, and for each external command, and writes them to a JSON report.
+    """
+
+    def __init__(self, report_path, profile_stage=None, profile_directory=None):
+        self.report_path = report_path
+        self.profile_stage = profile_stage
+        self.profile_directory = profile_directory or os.path.dirname(report_path)
+        self.started_at = time.time()
+        # Seconds from process start until the selected mode started running
+        self.startup_seconds = None
+        # The stages on the critical path of a stage graph run
+        self.critical_path = None
+        self.stages = []
+        self.commands = []
+        # Stages can run concurrently in worker threads so each thread has its own stack of active stages
+        self.thread_state = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def active_stages(self):
+        if not hasattr(self.thread_state, "active_stages"):
+            self.thread_state.active_stages = []
+        return self.thread_state.active_stages
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager which records the resources used by a stage"""
+        record = {
+            "name": name,
+            "parent": self.active_stages[-1]["name"] if self.active_stages else None,
+            "started_at": time.time(),
+            "items": 0,
+            "bytes": 0,
+            "status": "ok"
+        }
+        profiler = None
+        if name == self.profile_stage:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        self.active_stages.append(record)
+        start_wall = time.perf_counter()
+        start_cpu, start_children_cpu = get_cpu_times(THREAD_USAGE)
+        try:
+            yield record
+        except SystemExit as e:
+            record["status"] = "exit({})".format(e.code)
+            raise
+        except BaseException as e:
+            record["status"] = "failed: {}".format(type(e).__name__)
+            raise
+        finally:
+            end_cpu, end_children_cpu = get_cpu_times(THREAD_USAGE)
+            record["wall_seconds"] = round(time.perf_counter() - start_wall, 4)
+            record["cpu_seconds"] = round(end_cpu - start_cpu, 4)
+            record["child_cpu_seconds"] = round(end_children_cpu - start_children_cpu, 4)
+            record["peak_rss_kb"] = get_peak_rss_kb()
+            self.active_stages.pop()
+            self.stages.append(record)
+            if profiler:
+                profiler.disable()
+                profile_path = os.path.join(self.profile_directory, "profile-{}.prof".format(name))
+                profiler.dump_stats(profile_path)
+                print("Profile of the {} stage written to {}".format(name, profile_path))
+            print("Stage {} took {:.2f} seconds ({:.2f} CPU seconds).".format(
+                name, record["wall_seconds"], record["cpu_seconds"] + record["child_cpu_seconds"]))
+            self.write()
+
+    def add(self, items=0, bytes=0):
+        """Adds item and byte counts to the innermost active stage"""
+        if self.active_stages:
+            self.active_stages[-1]["items"] += items
+            self.active_stages[-1]["bytes"] += bytes
+
+    def record_command(self, command, wall_seconds, returncode, output_bytes=0):
+        self.commands.append({
+            "command": command,
+            "stage": self.active_stages[-1]["name"] if self.active_stages else None,
+            "wall_seconds": round(wall_seconds, 4),
+            "returncode": returncode,
+            "output_bytes": output_bytes
+        })
+
+    def write(self):
+        """Writes the report atomically so it is always readable, even after a failed run"""
+        report_directory = os.path.dirname(self.report_path)
+        if report_directory and not os.path.exists(report_directory):
+            os.makedirs(report_directory)
+        total_cpu, total_children_cpu = get_cpu_times()
+        report = {
+            "started_at": self.started_at,
+            "wall_seconds": round(time.time() - self.started_at, 4),
+            "startup_seconds": self.startup_seconds,
+            "cpu_seconds": round(total_cpu, 4),
+            "child_cpu_seconds": round(total_children_cpu, 4),
+            "peak_rss_kb": get_peak_rss_kb(),
+            "critical_path": self.critical_path,
+            "stages": self.stages,
+            "commands": self.commands
+        }
+        with self.lock:
+            temp_path = "{}.tmp".format(self.report_path)
+            with open(temp_path, "w") as report_file:
+                json.dump(report, report_file, indent=1)
+            os.replace(temp_path, self.report_path)
+
+
+def instrumented(stage_name):
+    """Decorator which records an AutomationContainer method as a stage of the run report"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.run_report.stage(stage_name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,166 @@
+import hashlib
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def has_name_prefix(file_name, name_prefixes):
+    """
+    Checks whether file_name starts with one of name_prefixes followed by a non-alphanumeric
+    character, so that LVC20-101 matches LVC20-101.png but not LVC20-1010.png.
+    """
+    for name_prefix in name_prefixes:
+        if file_name.startswith(name_prefix):
+            if len(file_name) == len(name_prefix) or not file_name[len(name_prefix)].isalnum():
+                return True
+    return False
+
+
+class S3SyncManager:
+    """
+    Syncs local directories to an S3 prefix in-process. Each prefix is listed once and only
+    files whose size or MD5/ETag differ from the remote object are uploaded, concurrently,
+    over a shared connection pool.
+    """
+
+    def __init__(self, bucket, client=None, max_workers=10, session=None):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+        self.bucket = bucket
+        self.max_workers = max_workers
+        if client is None:
+            client = (session or boto3).client("s3", config=Config(max_pool_connections=max_workers * 2))
+        self.client = client
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=2)
+        # Keys and total bytes uploaded during this run
+        self.uploaded_keys = []
+        self.uploaded_bytes = 0
+
+    @staticmethod
+    def is_included(relative_path, filters):
+        """
+        Applies (include|exclude, pattern) filters in the same way as the AWS CLI.
+        Files are included by default and filters later in the list take precedence.
+        """
+        included = True
+        for filter_type, pattern in filters:
+            if fnmatchcase(relative_path, pattern):
+                included = filter_type == "include"
+        return included
+
+    def list_objects(self, prefix):
+        """Returns a dict of key -> {"size", "etag"} for every object under the prefix"""
+        objects = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for s3_object in page.get("Contents", []):
+                objects[s3_object["Key"]] = {
+                    "size": s3_object["Size"],
+                    "etag": s3_object["ETag"].strip('"')
+                }
+        return objects
+
+    def head_objects(self, keys):
+        """Returns a dict of key -> {"size", "etag"} for the keys that exist, one HEAD request per key"""
+        def head_object(key):
+            try:
+                response = self.client.head_object(Bucket=self.bucket, Key=key)
+            except Exception:
+                return key, None
+            return key, {"size": response["ContentLength"], "etag": response["ETag"].strip('"')}
+
+        objects = {}
+        if not keys:
+            return objects
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as executor:
+            for key, s3_object in executor.map(head_object, keys):
+                if s3_object is not None:
+                    objects[key] = s3_object
+        return objects
+
+    def get_local_files(self, local_directory, filters):
+        """Returns a dict of relative path -> full path for the local files passing the filters"""
+        local_files = {}
+        for root, directories, files in os.walk(local_directory):
+            directories.sort()
+            for file_name in sorted(files):
+                full_path = os.path.join(root, file_name)
+                relative_path = os.path.relpath(full_path, local_directory).replace(os.sep, "/")
+                if self.is_included(relative_path, filters):
+                    local_files[relative_path] = full_path
+        return local_files
+
+    @staticmethod
+    def get_local_etag(file_path, etag):
+        """Computes the ETag S3 would give the local file, matching multipart ETags where needed"""
+        if "-" not in etag:
+            file_hash = hashlib.md5()
+            with open(file_path, "rb") as local_file:
+                for block in iter(lambda: local_file.read(1024 * 1024), b""):
+                    file_hash.update(block)
+            return file_hash.hexdigest()
+        part_digests = []
+        with open(file_path, "rb") as local_file:
+            for block in iter(lambda: local_file.read(MULTIPART_CHUNK_SIZE), b""):
+                part_digests.append(hashlib.md5(block).digest())
+        return "{}-{}".format(hashlib.md5(b"".join(part_digests)).hexdigest(), len(part_digests))
+
+    def needs_upload(self, file_path, remote_object):
+        if remote_object is None:
+            return True
+        if os.path.getsize(file_path) != remote_object["size"]:
+            return True
+        return self.get_local_etag(file_path, remote_object["etag"]) != remote_object["etag"]
+
+    def upload_file(self, file_path, key):
+        extra_args = {}
+        content_type = mimetypes.guess_type(file_path)[0]
+        if content_type:
+            extra_args["ContentType"] = content_type
+        self.client.upload_file(file_path, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        return key, os.path.getsize(file_path)
+
+    def upload_files(self, uploads):
+        """Uploads a list of (file path, key) tuples concurrently, returning the uploaded keys"""
+        uploaded_keys = []
+        if not uploads:
+            return uploaded_keys
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(uploads))) as executor:
+            for key, size in executor.map(lambda upload: self.upload_file(*upload), uploads):
+                print("upload: s3://{}/{}".format(self.bucket, key))
+                uploaded_keys.append(key)
+                self.uploaded_bytes += size
+        self.uploaded_keys.extend(uploaded_keys)
+        return uploaded_keys
+
+    def sync(self, local_directory, prefix, filters=None, name_prefixes=None):
+        """
+        Uploads the files in local_directory that pass the filters and differ from the objects
+        under prefix. Returns the list of keys that were uploaded.
+        If name_prefixes is given only the files named after one of them are synced, and just
+        their keys are checked instead of listing the whole prefix.
+        """
+        filters = filters or []
+        if not prefix.endswith("/"):
+            prefix += "/"
+        local_files = self.get_local_files(local_directory, filters)
+        if name_prefixes is not None:
+            local_files = dict((relative_path, full_path) for relative_path, full_path in local_files.items()
+                               if has_name_prefix(os.path.basename(full_path), name_prefixes))
+            remote_objects = self.head_objects([prefix + relative_path for relative_path in local_files])
+        else:
+            remote_objects = self.list_objects(prefix)
+        uploads = []
+        for relative_path, full_path in local_files.items():
+            key = prefix + relative_path
+            if self.needs_upload(full_path, remote_objects.get(key)):
+                uploads.append((full_path, key))
+        print("Syncing {} to s3://{}/{}: {} changed files".format(local_directory, self.bucket, prefix, len(uploads)))
+        return self.upload_files(uploads)
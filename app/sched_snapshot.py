@@ -0,0 +1,77 @@
+import json
+import os
+import time
+from manifest import content_digest
+
+
+class SchedSnapshot:
+    """
+    Persists the Sched sessions export in the working directory with the time it was fetched
+    and a content hash per session. Snapshots younger than max_age seconds are reused instead
+    of fetching the export again. On refresh the added, changed and removed sessions are
+    worked out against the previous snapshot and saved with it, so a reused snapshot still
+    reports the changes of the fetch that produced it.
+    """
+
+    def __init__(self, sched_data_interface, snapshot_path, max_age=0):
+        self.sched_data_interface = sched_data_interface
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self.fetched_at = None
+        self.added = set()
+        self.changed = set()
+        self.removed = set()
+
+    def read(self):
+        try:
+            with open(self.snapshot_path) as snapshot_file:
+                return json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, snapshot):
+        snapshot_directory = os.path.dirname(self.snapshot_path)
+        if snapshot_directory and not os.path.exists(snapshot_directory):
+            os.makedirs(snapshot_directory)
+        temp_path = "{}.tmp".format(self.snapshot_path)
+        with open(temp_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temp_path, self.snapshot_path)
+
+    def load(self):
+        """Returns the sessions data, either from a fresh enough snapshot or from the Sched API"""
+        previous = self.read()
+        if previous and self.max_age > 0:
+            age = time.time() - previous["fetched_at"]
+            if age <= self.max_age:
+                self.fetched_at = previous["fetched_at"]
+                changes = previous.get("changes") or {}
+                self.added, self.changed, self.removed = [
+                    set(changes.get(change) or []) for change in ["added", "changed", "removed"]]
+                print("Using the Sched snapshot fetched {:.0f} seconds ago ({} added, {} changed, {} removed sessions).".format(
+                    age, len(self.added), len(self.changed), len(self.removed)))
+                return previous["sessions"]
+        print("Fetching the Sched sessions export...")
+        sessions = self.sched_data_interface.getSessionsData()
+        self.fetched_at = time.time()
+        session_hashes = {session_id: content_digest(session) for session_id, session in sessions.items()}
+        previous_hashes = previous["session_hashes"] if previous else {}
+        self.added = set(session_hashes) - set(previous_hashes)
+        self.removed = set(previous_hashes) - set(session_hashes)
+        self.changed = set(
+            session_id for session_id in set(session_hashes) & set(previous_hashes)
+            if session_hashes[session_id] != previous_hashes[session_id])
+        self.write({
+            "fetched_at": self.fetched_at,
+            "session_hashes": session_hashes,
+            "changes": {
+                "added": sorted(self.added),
+                "changed": sorted(self.changed),
+                "removed": sorted(self.removed)
+            },
+            "sessions": sessions
+        })
+        print("Sched export: {} added, {} changed, {} removed sessions.".format(
+            len(self.added), len(self.changed), len(self.removed)))
+        return sessions
+
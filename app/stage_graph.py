@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Stage:
+    def __init__(self, name, function, dependencies):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.status = "pending"
+        self.exit_code = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.finished_at is None:
+            return 0
+        return self.finished_at - self.started_at
+
+
+class StageGraph:
+    """
+    Runs a set of pipeline stages with declared dependencies, running independent stages
+    concurrently. A stage succeeds when its function returns a truthy value. Once a stage fails
+    no new stages are started, the running ones are allowed to finish and the failure is returned.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, function, dependencies=()):
+        for dependency in dependencies:
+            if dependency not in self.stages:
+                raise ValueError("Stage {} depends on unknown stage {}".format(name, dependency))
+        self.stages[name] = Stage(name, function, dependencies)
+
+    def run_stage(self, stage):
+        stage.started_at = time.time()
+        try:
+            stage.status = "succeeded" if stage.function() else "failed"
+        except SystemExit as e:
+            stage.status = "failed"
+            stage.exit_code = e.code
+        except Exception as e:
+            print("ERROR: Stage {} raised {}: {}".format(stage.name, type(e).__name__, e))
+            stage.status = "failed"
+        finally:
+            stage.finished_at = time.time()
+        return stage
+
+    def get_ready_stages(self):
+        return [stage for stage in self.stages.values() if stage.status == "pending" and
+                all(self.stages[dependency].status == "succeeded" for dependency in stage.dependencies)]
+
+    def run(self):
+        """Runs the graph, returning the first failed Stage or None if every stage succeeded"""
+        failed_stage = None
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if failed_stage is None:
+                    for stage in self.get_ready_stages():
+                        stage.status = "running"
+                        print("Starting stage {}...".format(stage.name))
+                        running[executor.submit(self.run_stage, stage)] = stage
+                if not running:
+                    break
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    print("Stage {} {} in {:.2f} seconds.".format(stage.name, stage.status, stage.duration))
+                    if stage.status == "failed" and failed_stage is None:
+                        failed_stage = stage
+        for stage in self.stages.values():
+            if stage.status == "pending":
+                stage.status = "skipped"
+        return failed_stage
+
+    def critical_path(self):
+        """
+        Returns the chain of stages that bounded the run time, found by walking back from
+        the last stage to finish through the dependency that finished last.
+        """
+        finished = [stage for stage in self.stages.values() if stage.finished_at is not None]
+        if not finished:
+            return []
+        path = []
+        stage = max(finished, key=lambda finished_stage: finished_stage.finished_at)
+        while stage is not None:
+            path.append(stage)
+            dependencies = [self.stages[dependency] for dependency in stage.dependencies
+                            if self.stages[dependency].finished_at is not None]
+            stage = max(dependencies, key=lambda dependency: dependency.finished_at) if dependencies else None
+        return list(reversed(path))
+
+    def print_summary(self):
+        path = self.critical_path()
+        if not path:
+            return []
+        print("Critical path ({:.2f} seconds):".format(path[-1].finished_at - path[0].started_at))
+        for stage in path:
+            print("  {:<30} {:>8.2f}s".format(stage.name, stage.duration))
+        return [{"name": stage.name, "seconds": round(stage.duration, 4)} for stage in path]
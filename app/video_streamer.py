@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from googleapiclient.http import MediaUpload
+
+# YouTube requires resumable upload chunks to be a multiple of 256KB
+CHUNK_SIZE = 32 * 256 * 1024
+
+
+class HTTPRangeMediaUpload(MediaUpload):
+    """
+    A resumable MediaUpload which streams the video from the CDN with HTTP range requests.
+    While a chunk is being uploaded the next one is downloaded, so at most two chunks are held
+    in memory and nothing is written to disk.
+    """
+
+    def __init__(self, url, mimetype="video/mp4", chunksize=CHUNK_SIZE, session=None, timeout=60):
+        self.url = url
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        head = self.session.head(url, allow_redirects=True, timeout=timeout)
+        head.raise_for_status()
+        self._size = int(head.headers["Content-Length"])
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.lock = threading.Lock()
+        self.prefetched = {}
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def download_range(self, begin, length):
+        end = min(begin + length, self._size) - 1
+        response = self.session.get(
+            self.url, headers={"Range": "bytes={}-{}".format(begin, end)}, timeout=self.timeout)
+        response.raise_for_status()
+        if response.status_code != 206 and not (begin == 0 and end == self._size - 1):
+            raise IOError("{} does not support range requests".format(self.url))
+        return response.content
+
+    def getbytes(self, begin, length):
+        """Returns the requested chunk and starts downloading the chunk after it"""
+        with self.lock:
+            future = self.prefetched.pop((begin, length), None)
+            # Drop any prefetched chunk that is no longer needed, e.g after YouTube asks for a retry
+            self.prefetched.clear()
+        chunk = future.result() if future else self.download_range(begin, length)
+        next_begin = begin + len(chunk)
+        if next_begin < self._size:
+            with self.lock:
+                self.prefetched[(next_begin, length)] = self.executor.submit(self.download_range, next_begin, length)
+        return chunk
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+_thread_services = threading.local()
+
+
+def get_thread_youtube_service(video_manager):
+    """
+    Returns a YouTube service for the calling thread from the uploader's public
+    get_authenticated_service(), as the underlying httplib2 connections can't be shared between
+    threads. Each thread builds its service once per uploader.
+    """
+    if getattr(_thread_services, "video_manager", None) is not video_manager:
+        if not callable(getattr(video_manager, "get_authenticated_service", None)):
+            raise AttributeError("{} has no get_authenticated_service() to stream videos with".format(
+                type(video_manager).__name__))
+        _thread_services.service = video_manager.get_authenticated_service()
+        _thread_services.video_manager = video_manager
+    return _thread_services.service
+
+
+def get_video_body(video_options):
+    """Converts the ConnectYoutubeUploader video options into a YouTube videos.insert body"""
+    return {
+        "snippet": {
+            "title": video_options["title"],
+            "description": video_options["description"],
+            "tags": [tag.strip() for tag in video_options["tags"].split(",") if tag.strip()],
+            "categoryId": video_options["category"]
+        },
+        "status": {
+            "privacyStatus": video_options["privacyStatus"]
+        }
+    }
+
+
+def load_checkpoint(checkpoint_path):
+    try:
+        with open(checkpoint_path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    temp_path = "{}.tmp".format(checkpoint_path)
+    with open(temp_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temp_path, checkpoint_path)
+
+
+def resume_upload(request, media):
+    """
+    Asks YouTube how much of the request's resumable upload it has received, with an empty PUT
+    to the session URI, and moves the request on to the first missing byte. Returns the
+    response body if the upload had already completed, or False if the session has expired.
+    """
+    response, content = request.http.request(request.resumable_uri, method="PUT", headers={
+        "Content-Length": "0",
+        "Content-Range": "bytes */{}".format(media.size())})
+    if response.status in [200, 201]:
+        return json.loads(content)
+    if response.status == 308:
+        # The Range header is missing when no bytes have been received yet
+        received_range = response.get("range")
+        request.resumable_progress = int(received_range.split("-")[1]) + 1 if received_range else 0
+        return None
+    if response.status in [404, 410]:
+        return False
+    raise IOError("Unexpected status {} querying the upload of {}".format(response.status, request.resumable_uri))
+
+
+def stream_video_to_youtube(youtube, video_url, video_options, checkpoint_path, chunksize=CHUNK_SIZE):
+    """
+    Streams a video from video_url into a YouTube resumable upload. The resumable session URI
+    is saved to checkpoint_path after every chunk so an interrupted transfer resumes where
+    it stopped. Returns the YouTube video id.
+    """
+    media = HTTPRangeMediaUpload(video_url, chunksize=chunksize)
+    try:
+        request = youtube.videos().insert(
+            part="snippet,status", body=get_video_body(video_options), media_body=media)
+        response = None
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint and checkpoint["url"] == video_url and checkpoint["size"] == media.size():
+            print("Resuming the upload of {} from the saved checkpoint...".format(video_url))
+            request.resumable_uri = checkpoint["resumable_uri"]
+            response = resume_upload(request, media)
+            if response is False:
+                print("The saved upload session has expired, starting again...")
+                request.resumable_uri = None
+                request.resumable_progress = 0
+                response = None
+        while response is None:
+            status, response = request.next_chunk(num_retries=5)
+            if request.resumable_uri:
+                save_checkpoint(checkpoint_path, {
+                    "url": video_url,
+                    "size": media.size(),
+                    "resumable_uri": request.resumable_uri,
+                    "progress": request.resumable_progress
+                })
+            if status:
+                print("Uploaded {:.0%} of {}".format(status.progress(), video_url))
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return response["id"]
+    finally:
+        media.close()
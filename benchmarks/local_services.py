@@ -0,0 +1,181 @@
+import hashlib
+import io
+import os
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalHTTPServer:
+    """Serves a directory over HTTP on localhost, answering conditional requests with 304s"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        served_directory = directory
+
+        class Handler(SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=served_directory, **kwargs)
+
+            def send_head(self):
+                path = self.translate_path(self.path)
+                if os.path.isfile(path):
+                    with open(path, "rb") as served_file:
+                        etag = '"{}"'.format(hashlib.md5(served_file.read()).hexdigest())
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return None
+                    self.etag = etag
+                return super().send_head()
+
+            def end_headers(self):
+                if getattr(self, "etag", None):
+                    self.send_header("ETag", self.etag)
+                super().end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeS3Paginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix=""):
+        contents = [
+            {"Key": key, "Size": len(body), "ETag": '"{}"'.format(hashlib.md5(body).hexdigest())}
+            for key, body in sorted(self.client.objects.get(Bucket, {}).items()) if key.startswith(Prefix)]
+        for index in range(0, max(len(contents), 1), 1000):
+            yield {"Contents": contents[index:index + 1000]}
+
+
+class FakeS3Client:
+    """An in-memory stand-in for the parts of the boto3 S3 client used by the automation"""
+
+    def __init__(self):
+        self.objects = {}
+        self.metadata = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def get_paginator(self, operation_name):
+        return FakeS3Paginator(self)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+        with open(Filename, "rb") as upload:
+            body = upload.read()
+        self.put_object(Bucket=Bucket, Key=Key, Body=body, **(ExtraArgs or {}))
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if isinstance(Body, io.IOBase):
+            Body = Body.read()
+        with self.lock:
+            self.requests += 1
+            self.objects.setdefault(Bucket, {})[Key] = bytes(Body)
+            self.metadata.setdefault(Bucket, {})[Key] = kwargs
+        return {"ETag": '"{}"'.format(hashlib.md5(Body).hexdigest())}
+
+    def head_object(self, Bucket, Key):
+        with self.lock:
+            self.requests += 1
+            body = self.objects.get(Bucket, {}).get(Key)
+            if body is None:
+                raise KeyError(Key)
+            extra = self.metadata[Bucket][Key]
+        return {
+            "ContentLength": len(body),
+            "ETag": '"{}"'.format(hashlib.md5(body).hexdigest()),
+            "Metadata": extra.get("Metadata", {})
+        }
+
+
+class FakeCloudFrontClient:
+    """Records invalidations instead of sending them to CloudFront"""
+
+    def __init__(self):
+        self.invalidations = []
+
+    def create_invalidation(self, DistributionId, InvalidationBatch):
+        self.invalidations.append(InvalidationBatch["Paths"]["Items"])
+        return {"Invalidation": {"Id": "I{}".format(len(self.invalidations))}}
+
+
+class LocalGitRemote:
+    """
+    A bare git repository standing in for the website repository, with a working clone
+    laid out like the automation's website checkout.
+    """
+
+    def __init__(self, directory, uid):
+        self.bare_directory = os.path.join(directory, "remote.git")
+        self.uid = uid.lower()
+
+    def run_git(self, arguments, cwd):
+        subprocess.run(["git"] + arguments, cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def create(self, checkout_directory):
+        """Creates the bare remote and clones it into checkout_directory"""
+        self.run_git(["init", "--bare", "-q", self.bare_directory], cwd=os.path.dirname(self.bare_directory))
+        self.run_git(["clone", "-q", self.bare_directory, checkout_directory], cwd=os.path.dirname(self.bare_directory))
+        for path in ["_posts/{}/sessions".format(self.uid), "assets/images/featured-images/{}".format(self.uid)]:
+            os.makedirs(os.path.join(checkout_directory, path))
+            with open(os.path.join(checkout_directory, path, ".gitkeep"), "w"):
+                pass
+        self.run_git(["symbolic-ref", "HEAD", "refs/heads/master"], cwd=checkout_directory)
+        self.run_git(["add", "--all"], cwd=checkout_directory)
+        self.run_git(["-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "Initial"],
+                     cwd=checkout_directory)
+        self.run_git(["push", "-q", "origin", "master"], cwd=checkout_directory)
+
+
+class LocalGitHubManager:
+    """Stands in for GitHubManager, committing and pushing to a LocalGitRemote"""
+
+    def __init__(self, checkout_directory):
+        from git import Repo
+        self.checkout_directory = checkout_directory
+        self.repo = Repo(checkout_directory)
+        self.pushes = 0
+
+    def get_changed_files(self, paths=None):
+        if paths is not None and len(paths) == 0:
+            return []
+        pathspec = [] if paths is None else ["--"] + [
+            os.path.relpath(path, self.checkout_directory) for path in sorted(paths)]
+        result = subprocess.run(["git", "status", "--porcelain", "--no-renames", "-z"] + pathspec,
+                                cwd=self.checkout_directory, check=True, stdout=subprocess.PIPE)
+        return [entry[3:] for entry in result.stdout.decode("utf-8").split("\0") if entry]
+
+    def has_changes(self, paths=None):
+        return len(self.get_changed_files(paths)) > 0
+
+    def commit_and_push_changes(self, commit_message, paths=None):
+        git_options = ["-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+        changed_files = self.get_changed_files(paths)
+        if not changed_files:
+            return False
+        subprocess.run(["git", "add", "--all", "--"] + changed_files, cwd=self.checkout_directory, check=True)
+        subprocess.run(["git"] + git_options + ["commit", "-q", "-m", commit_message], cwd=self.checkout_directory, check=True)
+        subprocess.run(["git", "push", "-q", "origin", "master"], cwd=self.checkout_directory, check=True)
+        self.pushes += 1
+        return True
+
+    def create_pull_request(self, title, description):
+        return True
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the AutomationContainer pipeline stages against synthetic Sched events.
+
+Every external service is replaced by a local stand-in: a bare git remote for the website
+repository, an in-memory S3/CloudFront client and a local HTTP server for speaker avatars and
+the files attached to sessions.
+Each event size is run twice, once from an empty working directory and once after
+--change-rate of the sessions have been edited, and the per-stage timings are compared
+against a stored baseline. Run inside the container image so the Connect modules are available.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, "..", "app"))
+
+from main import AutomationContainer
+from cloudfront_manager import CloudFrontManager, DEFAULT_INVALIDATION_THRESHOLD
+from run_report import RunReport
+from s3_sync_manager import S3SyncManager
+from sched_snapshot import SchedSnapshot
+from local_services import (FakeCloudFrontClient, FakeS3Client, LocalGitHubManager, LocalGitRemote,
+                            LocalHTTPServer)
+from synthetic_sched import generate_event, mutate_event
+
+UID = "BENCH20"
+
+
+class SyntheticSchedDataInterface:
+    """Returns a synthetic export in place of the Sched API"""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    def getSessionsData(self):
+        return self.sessions
+
+
+def create_avatars(avatar_directory, count):
+    """Writes a JPEG avatar for each synthetic speaker, named like the stripped Sched avatar URLs"""
+    from PIL import Image
+    os.makedirs(avatar_directory)
+    for index in range(count):
+        avatar = Image.new("RGB", (320, 320), ((index * 37) % 255, (index * 91) % 255, (index * 13) % 255))
+        avatar.save(os.path.join(avatar_directory, "speaker-{}".format(index)), "JPEG")
+
+
+def create_attachments(attachment_directory, count, size=256 * 1024):
+    """Writes the slides and other files the synthetic sessions link to, filled with random bytes"""
+    os.makedirs(attachment_directory)
+    for index in range(count):
+        for file_name, header in [("slides-{}.pdf".format(index), b"%PDF-1.4\n"), ("demo-{}.zip".format(index), b"PK")]:
+            with open(os.path.join(attachment_directory, file_name), "wb") as attachment_file:
+                attachment_file.write(header + os.urandom(size - len(header)))
+
+
+def create_assets(assets_directory):
+    """
+    Copies the fonts and placeholder image into a temporary assets directory, with a share image
+    template for the benchmark event, so the avatar cache doesn't write into the real assets
+    """
+    source_directory = os.path.join(BENCHMARK_DIRECTORY, "..", "app", "assets")
+    shutil.copytree(os.path.join(source_directory, "fonts"), os.path.join(assets_directory, "fonts"))
+    shutil.copytree(os.path.join(source_directory, "images"), os.path.join(assets_directory, "images"))
+    os.makedirs(os.path.join(assets_directory, "templates"))
+    shutil.copy(os.path.join(source_directory, "templates", "lvc20-placeholder.jpg"),
+                os.path.join(assets_directory, "templates", "{}-placeholder.jpg".format(UID.lower())))
+
+
+def create_container(work_directory, assets_directory, sessions, args, s3_client, cloudfront_client, report_path):
+    """Builds an AutomationContainer wired to the local stand-ins without running a mode"""
+    from jekyll_post_tool import JekyllPostTool
+    container_args = argparse.Namespace(
+        image_workers=args.workers, no_upload=False, sched_max_age=0, profile_stage=None,
+        invalidation_threshold=DEFAULT_INVALIDATION_THRESHOLD, sparse_checkout=False)
+    dependencies = {
+        "s3_sync": S3SyncManager("static-linaro-org", client=s3_client),
+        "cloudfront_manager": CloudFrontManager("BENCHMARK", client=cloudfront_client),
+        "sched_data": sessions
+    }
+    container = AutomationContainer(
+        container_args, work_directory=work_directory, env={"bamboo_connect_uid": UID},
+        dependencies=dependencies, run=False, assets_directory=assets_directory)
+    container.run_report = RunReport(report_path)
+    container.github_manager = LocalGitHubManager("{}website".format(work_directory))
+    container.post_tool = JekyllPostTool(
+        {"output": "{}website/_posts/{}/sessions/".format(work_directory, UID.lower())}, verbose=False)
+    return container
+
+
+def run_phase(phase, work_directory, assets_directory, sessions, args, s3_client, cloudfront_client):
+    """
+    Runs the pipeline stages once and returns the stage records of the run report. A stage
+    which fails stops the benchmark, so failing work is never timed as if it had succeeded.
+    """
+    report_path = os.path.join(work_directory, "bench-{}.json".format(phase))
+    container = create_container(
+        work_directory, assets_directory, sessions, args, s3_client, cloudfront_client, report_path)
+    snapshot = SchedSnapshot(SyntheticSchedDataInterface(sessions), "{}sched/{}-sessions.json".format(
+        work_directory, UID.lower()))
+    with container.run_report.stage("sched_snapshot"):
+        snapshot.load()
+        container.run_report.add(items=len(sessions))
+    stages = [
+        ("social_images", container.social_media_images),
+        ("jekyll_posts", container.update_jekyll_posts),
+        ("presentations", lambda: container.update_presentations(
+            "{}presentations/".format(work_directory), "{}other_files/".format(work_directory)))
+    ]
+    for stage_name, stage in stages:
+        if not stage():
+            raise RuntimeError("The {} stage failed in the {} phase, see the output above".format(stage_name, phase))
+    container.invalidate_changed_paths()
+    return container.run_report.stages
+
+
+def benchmark_event(session_count, args):
+    """Benchmarks an event of session_count sessions, returning stage -> measurements"""
+    temp_directory = tempfile.mkdtemp(prefix="connect-bench-")
+    try:
+        avatar_directory = os.path.join(temp_directory, "http", "avatars")
+        create_avatars(avatar_directory, max(1, session_count // 2))
+        create_attachments(os.path.join(temp_directory, "http", "files"), max(1, session_count // 2))
+        http_server = LocalHTTPServer(os.path.join(temp_directory, "http")).start()
+        work_directory = os.path.join(temp_directory, "work_dir") + "/"
+        assets_directory = os.path.join(temp_directory, "assets") + "/"
+        create_assets(assets_directory)
+        os.makedirs(os.path.join(work_directory, "images"))
+        LocalGitRemote(temp_directory, UID).create("{}website".format(work_directory))
+        s3_client = FakeS3Client()
+        cloudfront_client = FakeCloudFrontClient()
+        sessions = generate_event(UID, session_count, http_server.base_url)
+        changed_sessions = mutate_event(sessions, UID, args.change_rate, http_server.base_url)
+        results = {}
+        for phase, phase_sessions in [("initial", sessions), ("incremental", changed_sessions)]:
+            for stage in run_phase(
+                    phase, work_directory, assets_directory, phase_sessions, args, s3_client, cloudfront_client):
+                wall_seconds = stage["wall_seconds"]
+                results["{}/{}".format(phase, stage["name"])] = {
+                    "wall_seconds": wall_seconds,
+                    "cpu_seconds": round(stage["cpu_seconds"] + stage["child_cpu_seconds"], 4),
+                    "items": stage["items"],
+                    "bytes": stage["bytes"],
+                    "items_per_second": round(stage["items"] / wall_seconds, 2) if wall_seconds else None
+                }
+        http_server.stop()
+        return results
+    finally:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Prints the results next to the baseline and returns the list of regressed stages"""
+    regressions = []
+    for event_size, stages in results.items():
+        print("\n{} sessions".format(event_size))
+        print("{:<40} {:>10} {:>10} {:>12} {:>10}".format("stage", "seconds", "baseline", "items/s", "change"))
+        for stage_name, measurement in sorted(stages.items()):
+            baseline_seconds = baseline.get(event_size, {}).get(stage_name, {}).get("wall_seconds")
+            change = ""
+            if baseline_seconds:
+                ratio = measurement["wall_seconds"] / baseline_seconds
+                change = "{:+.0%}".format(ratio - 1)
+                if ratio > 1 + tolerance:
+                    regressions.append("{} sessions {}".format(event_size, stage_name))
+                    change += " !"
+            print("{:<40} {:>10.3f} {:>10} {:>12} {:>10}".format(
+                stage_name, measurement["wall_seconds"],
+                "{:.3f}".format(baseline_seconds) if baseline_seconds else "-",
+                measurement["items_per_second"] if measurement["items_per_second"] is not None else "-", change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connect Automation benchmarks")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000],
+                        help="Event sizes (number of sessions) to benchmark.")
+    parser.add_argument("--change-rate", type=float, default=0.05,
+                        help="Fraction of sessions edited between the initial and incremental runs.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Image render/resize workers, 0 uses one per CPU.")
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARK_DIRECTORY, "baseline.json"),
+                        help="Baseline results to compare against.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the results to the baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline before a stage counts as a regression.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    for session_count in args.sessions:
+        print("Benchmarking a {} session event...".format(session_count))
+        results[str(session_count)] = benchmark_event(session_count, args)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    elif not args.update_baseline:
+        print("\nNo baseline at {}, record one on this machine with --update-baseline.".format(args.baseline))
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1, sort_keys=True)
+    if args.update_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=1, sort_keys=True)
+        print("\nBaseline written to {}".format(args.baseline))
+    elif regressions:
+        print("\nRegressed stages:")
+        for regression in regressions:
+            print("  {}".format(regression))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import copy
+import random
+
+TRACKS = ["Keynote", "Security", "Kernel", "Toolchain", "Cloud", "IoT and Embedded", "AI and Neural Networks"]
+WORDS = ["arm", "linux", "kernel", "open", "source", "firmware", "boot", "secure", "performance",
+         "upstream", "virtualization", "android", "tooling", "compiler", "testing", "edge", "server"]
+
+
+def random_sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def generate_speaker(rng, index, base_url):
+    return {
+        "name": "Speaker {}".format(index),
+        "position": rng.choice(["Engineer", "Director", "Maintainer", ""]),
+        "company": rng.choice(["Linaro", "Arm", "Acme", ""]),
+        "avatar": "{}avatars/speaker-{}.320x320px.jpg".format(base_url, index),
+        "about": random_sentence(rng, 30),
+        "role": "speaker"
+    }
+
+
+def generate_files(rng, attachment_count, base_url):
+    """
+    Returns the files of a session in the Sched export's {name, path} shape. Most sessions have
+    slides and some also have another file, picked from attachment_count files of each kind.
+    """
+    files = []
+    if rng.random() < 0.7:
+        files.append({"name": "slides.pdf",
+                      "path": "{}files/slides-{}.pdf".format(base_url, rng.randint(0, attachment_count - 1))})
+    if rng.random() < 0.2:
+        files.append({"name": "demo.zip",
+                      "path": "{}files/demo-{}.zip".format(base_url, rng.randint(0, attachment_count - 1))})
+    return files
+
+
+def generate_session(rng, uid, number, speaker_count, base_url):
+    session_id = "{}-{}".format(uid.upper(), 100 + number)
+    title = random_sentence(rng, rng.randint(4, 12))
+    speakers = [generate_speaker(rng, rng.randint(0, speaker_count - 1), base_url)
+                for _ in range(rng.randint(0, 3))]
+    return {
+        "session_id": session_id,
+        "name": "{} - {}".format(session_id, title),
+        "session_title": title,
+        "event_type": rng.choice(TRACKS),
+        "event_start": "2020-09-{:02d} {:02d}:00".format(rng.randint(15, 19), rng.randint(8, 18)),
+        "event_end": "2020-09-{:02d} {:02d}:50".format(rng.randint(15, 19), rng.randint(8, 18)),
+        "venue": "Room {}".format(rng.randint(1, 8)),
+        "description": random_sentence(rng, 80),
+        "speakers": speakers,
+        "files": generate_files(rng, speaker_count, base_url)
+    }
+
+
+def generate_event(uid, session_count, base_url, seed=0):
+    """
+    Generates a synthetic Sched export in the json_data shape used by AutomationContainer,
+    i.e. a dict of session id -> session. Avatars and attached files are served from base_url.
+    """
+    rng = random.Random(seed)
+    speaker_count = max(1, session_count // 2)
+    sessions = {}
+    for number in range(session_count):
+        session = generate_session(rng, uid, number, speaker_count, base_url)
+        sessions[session["session_id"]] = session
+    return sessions
+
+
+def mutate_event(sessions, uid, change_rate, base_url, seed=1):
+    """
+    Returns a copy of the event where change_rate of the sessions have been edited, half of
+    them with new slides, and roughly a tenth of that number have been added and removed.
+    """
+    rng = random.Random(seed)
+    mutated = copy.deepcopy(sessions)
+    session_ids = sorted(mutated.keys())
+    change_count = int(len(session_ids) * change_rate)
+    for session_id in rng.sample(session_ids, change_count):
+        session = mutated[session_id]
+        session["session_title"] = random_sentence(rng, rng.randint(4, 12))
+        session["name"] = "{} - {}".format(session_id, session["session_title"])
+        if rng.random() < 0.5:
+            session["files"] = generate_files(rng, max(1, len(session_ids) // 2), base_url)
+    churn = change_count // 10
+    for session_id in rng.sample(session_ids, churn):
+        del mutated[session_id]
+    next_number = len(session_ids)
+    for number in range(next_number, next_number + churn):
+        session = generate_session(rng, uid, number, max(1, next_number // 2), base_url)
+        mutated[session["session_id"]] = session
+    return mutated
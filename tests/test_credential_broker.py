@@ -0,0 +1,140 @@
+import base64
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from credential_broker import STS_REQUEST_BODY, STS_REQUEST_URL, CredentialBroker
+
+
+class LocalVault:
+    """A local HTTP stand-in for Vault's AWS IAM login and secret reads"""
+
+    def __init__(self, token_lease=3600, secret_lease=0):
+        self.logins = []
+        self.reads = []
+        vault = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, status_code, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != "/v1/auth/aws/login":
+                    self.send_json(404, {"errors": []})
+                    return
+                vault.logins.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_json(200, {"auth": {"client_token": "token-{}".format(len(vault.logins)),
+                                              "lease_duration": token_lease}})
+
+            def do_GET(self):
+                vault.reads.append((self.path, self.headers.get("X-Vault-Token")))
+                if not (self.headers.get("X-Vault-Token") or "").startswith("token-"):
+                    self.send_json(403, {"errors": ["permission denied"]})
+                    return
+                self.send_json(200, {"data": {"pw": "secret"}, "lease_duration": secret_lease})
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSTSClient:
+    """Returns new credentials from assume_role, expiring expires_in seconds later"""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = []
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        self.calls.append((RoleArn, RoleSessionName))
+        return {"Credentials": {
+            "AccessKeyId": "AKIDTEST{}".format(len(self.calls)),
+            "SecretAccessKey": "secret",
+            "SessionToken": "session-token",
+            "Expiration": datetime.datetime.fromtimestamp(time.time() + self.expires_in, datetime.timezone.utc)
+        }}
+
+
+class CredentialBrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.vault = LocalVault()
+        self.addCleanup(self.vault.stop)
+
+    def create_broker(self, sts_client, refresh_margin=300):
+        return CredentialBroker(self.vault.url, "test_role", "arn:aws:iam::123456789012:role/test",
+                                "TestSession", refresh_margin=refresh_margin, sts_client=sts_client)
+
+    def test_login_payload_is_a_signed_get_caller_identity(self):
+        broker = self.create_broker(FakeSTSClient())
+        broker.get_secret("secret/test")
+        payload = self.vault.logins[0]
+        self.assertEqual(payload["role"], "test_role")
+        self.assertEqual(payload["iam_http_request_method"], "POST")
+        self.assertEqual(base64.b64decode(payload["iam_request_url"]).decode("utf-8"), STS_REQUEST_URL)
+        self.assertEqual(base64.b64decode(payload["iam_request_body"]).decode("utf-8"), STS_REQUEST_BODY)
+        headers = json.loads(base64.b64decode(payload["iam_request_headers"]).decode("utf-8"))
+        self.assertTrue(all(isinstance(value, list) for value in headers.values()))
+        self.assertIn("Credential=AKIDTEST1/", headers["Authorization"][0])
+        self.assertIn("/us-east-1/sts/aws4_request", headers["Authorization"][0])
+        self.assertEqual(headers["X-Amz-Security-Token"], ["session-token"])
+
+    def test_secrets_share_one_login(self):
+        broker = self.create_broker(FakeSTSClient())
+        self.assertEqual(broker.get_secret("secret/one")["data"]["pw"], "secret")
+        self.assertEqual(broker.get_secret("secret/two")["data"]["pw"], "secret")
+        broker.get_secret("secret/one")
+        self.assertEqual(len(self.vault.logins), 1)
+        self.assertEqual([path for path, token in self.vault.reads], ["/v1/secret/one", "/v1/secret/two"])
+        self.assertEqual(set(token for path, token in self.vault.reads), {"token-1"})
+
+    def test_credentials_are_cached_until_refresh_margin(self):
+        sts_client = FakeSTSClient(expires_in=3600)
+        broker = self.create_broker(sts_client, refresh_margin=300)
+        first = broker.get_aws_credentials()
+        self.assertIs(broker.get_aws_credentials(), first)
+        self.assertEqual(len(sts_client.calls), 1)
+
+    def test_credentials_refresh_inside_refresh_margin(self):
+        sts_client = FakeSTSClient(expires_in=200)
+        broker = self.create_broker(sts_client, refresh_margin=300)
+        first = broker.get_aws_credentials()
+        second = broker.get_aws_credentials()
+        self.assertEqual(len(sts_client.calls), 2)
+        self.assertNotEqual(first["AccessKeyId"], second["AccessKeyId"])
+        metadata = broker.get_credential_metadata()
+        self.assertEqual(metadata["access_key"], "AKIDTEST3")
+        self.assertTrue(metadata["expiry_time"].endswith("+00:00"))
+
+    def test_boto3_session_uses_the_broker_credentials(self):
+        sts_client = FakeSTSClient(expires_in=3600)
+        broker = self.create_broker(sts_client)
+        credentials = broker.get_boto3_session().get_credentials()
+        self.assertEqual(credentials.method, "connect-credential-broker")
+        self.assertEqual(credentials.get_frozen_credentials().access_key, "AKIDTEST1")
+        self.assertEqual(len(sts_client.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()